@@ -5,99 +5,39 @@
 # ==========================================================
 
 import streamlit as st
-import sqlite3
 import os
-import hashlib
-import binascii
-import hmac
-from datetime import datetime
-from crewai import Crew, Process
-from trip_components import TripAgents, TripTasks
-from trip_utils import capture_output
-from textwrap import dedent
-import time
-import markdown2
-#from weasyprint import HTML
-import io
-import shutil
-import ctypes.util
-import re
+# Módulos leves: agentes, ferramentas e PDF (crewai, langchain, reportlab) só são
+# carregados pelos workers da fila, nunca na tela de login.
+from trip_db import UserDB
+from trip_assets import inject_css, session_report, sidebar_logo
+from trip_artifacts import REPORT_FILES, ArtifactStore, clean_markdown
+from trip_package import artifact_bytes, package_zip
+from trip_jobs import JobQueue, QueueFull, run_trip, ACTIVE_STATUSES, QUEUED, DONE, FAILED, JOB_WARMUP
 
 # ==========================================================
 # CONFIGURAÇÕES INICIAIS
 # ==========================================================
 
-DB_PATH = "users.db"
 os.environ["LITELLM_LOCAL_CACHE"] = "True"
-print(ctypes.util.find_library("gobject-2.0"))
 
 st.set_page_config(page_title="AgentAI Trip", page_icon="🌍", layout="wide")
 
-with open('style.css') as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+# CSS e logo vêm do cache do processo (lidos do disco uma única vez).
+inject_css()
 
-st.sidebar.image("Img/logoAI.png", width=200)
+sidebar_logo()
 
 # ==========================================================
 # FUNÇÕES DE LOGIN / SEGURANÇA
 # ==========================================================
 
-def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            salt TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'user',
-            created_at TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-
-    # cria admin padrão
-    cur.execute("SELECT id FROM users WHERE username='admin'")
-    if not cur.fetchone():
-        pwd_hash, salt = hash_password('admin123')
-        cur.execute(
-            "INSERT INTO users (username, password_hash, salt, role, created_at) VALUES (?, ?, ?, ?, ?)",
-            ('admin', pwd_hash, salt, 'admin', datetime.utcnow().isoformat())
-        )
-        conn.commit()
-    conn.close()
-
-def hash_password(password: str, salt: bytes = None):
-    if salt is None:
-        salt = os.urandom(16)
-    dk = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 200000)
-    return binascii.hexlify(dk).decode(), binascii.hexlify(salt).decode()
-
-def verify_password(stored_hash_hex, stored_salt_hex, password_attempt):
-    salt = binascii.unhexlify(stored_salt_hex)
-    attempt_hash_hex, _ = hash_password(password_attempt, salt)
-    return hmac.compare_digest(attempt_hash_hex, stored_hash_hex)
+@st.cache_resource
+def get_user_db():
+    """Conexão única com o users.db por processo (o esquema é criado só na primeira vez)."""
+    return UserDB()
 
 def authenticate_user(username, password):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT password_hash, salt, role FROM users WHERE username=?", (username,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return False, "Usuário não encontrado", None
-    stored_hash, stored_salt, role = row
-    ok = verify_password(stored_hash, stored_salt, password)
-    if ok:
-        return True, "Autenticado", role
-    else:
-        return False, "Senha incorreta", None
-
-init_db()
+    return get_user_db().authenticate(username, password)
 
 # ==========================================================
 # CONTROLE DE SESSÃO
@@ -160,159 +100,39 @@ Aqui você pode:
 
 # --------------------------- CONFIGURAÇÃO DO APP PRINCIPAL --------------------------- #
 
-OUTPUT_DIR = os.path.join(os.getcwd(), "viagem")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-files = {
-    "roteiro_viagem.md": "roteiro_viagem.pdf",
-    "guia_comunicacao.md": "guia_comunicacao.pdf",
-    "relatorio_local.md": "relatorio_local.pdf",
-    "relatorio_logistica.md": "relatorio_logistica.pdf"
-}
-
-class TripCrew:
-    def __init__(self, from_city, destination_city, date_from, date_to, interests):
-        self.from_city = from_city
-        self.destination_city = destination_city
-        self.date_from = date_from
-        self.date_to = date_to
-        self.interests = interests
-
-    def run(self):
-        agents = TripAgents()
-        tasks = TripTasks()
-
-        city_info_agent = agents.city_info_agent()
-        logistics_expert_agent = agents.logistics_expert_agent()
-        itinerary_planner_agent = agents.itinerary_planner_agent()
-        language_guide_agent = agents.language_guide_agent()
-
-        city_info = tasks.city_info_task(
-            city_info_agent, self.from_city, self.destination_city, 
-            self.interests, self.date_from, self.date_to
-        )
-
-        plan_logistics = tasks.plan_logistics_task(
-            [city_info], logistics_expert_agent,
-            self.destination_city, self.interests, self.date_from, self.date_to
-        )
-
-        build_itinerary = tasks.build_itinerary_task(
-            [city_info, plan_logistics],
-            itinerary_planner_agent, self.destination_city,
-            self.interests, self.date_from, self.date_to
-        )
-
-        language_guide = tasks.language_guide_task(
-            [build_itinerary], language_guide_agent, self.destination_city
-        )
-
-        crew = Crew(
-            agents=[city_info_agent, logistics_expert_agent, itinerary_planner_agent, language_guide_agent],
-            tasks=[city_info, plan_logistics, build_itinerary, language_guide],
-            process=Process.sequential,
-            full_output=True,
-            verbose=True
-        )
-        return crew.kickoff()
-
-def load_markdown(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            return content.replace("```markdown", "").replace("```", "")
-    except Exception as e:
-        print(f"Erro ao carregar arquivo: {str(e)}")
-        return None
-
-########################## Função de conversão Markdown para pdf atualizado
-
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-
-
-
-def convert_md_to_pdf(file_md, file_pdf):
-    """
-    Converte arquivo Markdown em PDF com detecção de títulos e listas.
-    100% compatível com Streamlit Cloud.
-    """
-    text = load_markdown(file_md)
-    if not text:
-        return
-
-    # Converte Markdown para HTML estruturado
-    html_text = markdown2.markdown(text)
-
-    # Quebra o HTML básico em blocos (parágrafos e listas)
-    html_lines = html_text.split("\n")
-
-    # Documento PDF
-    doc = SimpleDocTemplate(
-        file_pdf,
-        pagesize=A4,
-        rightMargin=40,
-        leftMargin=40,
-        topMargin=60,
-        bottomMargin=40
-    )
-
-    styles = getSampleStyleSheet()
-    normal = styles["Normal"]
-    normal.fontName = "Helvetica"
-    normal.fontSize = 11
-    normal.leading = 14
-
-    h1 = ParagraphStyle("Heading1", parent=normal, fontSize=16, leading=18,
-                        spaceAfter=8, textColor=colors.HexColor("#1a73e8"))
-    h2 = ParagraphStyle("Heading2", parent=normal, fontSize=13, leading=16,
-                        spaceAfter=6, textColor=colors.darkblue)
-
-    story = []
-
-    for line in html_lines:
-        line = line.strip()
-        if not line:
-            story.append(Spacer(1, 6))
-            continue
-
-        # Detecta headers convertidos pelo markdown2
-        if line.startswith("<h1>"):
-            content = re.sub(r"</?h1>", "", line)
-            story.append(Paragraph(content, h1))
-        elif line.startswith("<h2>"):
-            content = re.sub(r"</?h2>", "", line)
-            story.append(Paragraph(content, h2))
-        elif line.startswith("<ul>"):
-            # lista simples
-            items = re.findall(r"<li>(.*?)</li>", line)
-            if items:
-                lista = ListFlowable(
-                    [ListItem(Paragraph(item, normal)) for item in items],
-                    bulletType='bullet',
-                    leftIndent=15
-                )
-                story.append(lista)
-        elif line.startswith("<p>"):
-            content = re.sub(r"</?p>", "", line)
-            story.append(Paragraph(content, normal))
-        else:
-            # fallback: texto simples
-            story.append(Paragraph(re.sub(r"<.*?>", "", line), normal))
-
-        story.append(Spacer(1, 4))
-
-    doc.build(story)
-
-
+files = REPORT_FILES
+
+@st.cache_resource
+def get_job_queue():
+    """Fila de trabalhos única por processo, compartilhada por todas as sessões."""
+    queue = JobQueue(run_trip)
+    # Retoma trabalhos que estavam em andamento quando o processo foi reiniciado.
+    queue.recover()
+    # Criada só após o login: os workers já carregam a pilha de agentes e PDF em segundo plano.
+    if JOB_WARMUP:
+        queue.warm_up()
+    return queue
+
+@st.cache_resource
+def get_artifact_store():
+    """Relatórios e PDFs de cada execução (workspace por usuário e trabalho)."""
+    return ArtifactStore()
+
+job_queue = get_job_queue()
+artifact_store = get_artifact_store()
+
+def current_job():
+    """Trabalho da sessão, da URL ou, após um novo login, o último do usuário (se for dele)."""
+    job_id = st.session_state.get('job_id') or st.query_params.get("job")
+    job = job_queue.get(job_id) if job_id else job_queue.latest_for(st.session_state.username)
+    return job if job and job["username"] == st.session_state.username else None
 
 ##################################################################
 def clear_output():
-    for item in os.listdir(OUTPUT_DIR):
-        os.remove(os.path.join(OUTPUT_DIR, item))
+    # Remove apenas o workspace da execução do próprio usuário.
+    job = current_job()
+    if job:
+        artifact_store.delete_run(job["id"], st.session_state.username)
     st.success("🧹 Conteúdo removido com sucesso!")
     st.rerun()
 
@@ -347,52 +167,163 @@ if submitted:
     if not (from_city and destination_city and interests):
         st.warning("Por favor, preencha todos os campos do formulário")
     else:
-        with st.status("Montando seu roteiro... Isso pode levar alguns instantes..."):
-            trip_crew = TripCrew(from_city, destination_city, date_from, date_to, interests)
-            result = trip_crew.run()
-
-        for md_file, pdf_file in files.items():
-            convert_md_to_pdf(md_file, os.path.join(OUTPUT_DIR, pdf_file))
-            if os.path.exists(md_file):
-                shutil.move(md_file, os.path.join(OUTPUT_DIR, md_file))
-        st.success("✅ Roteiro gerado com sucesso!")
-
-files_md = [md for md in files if os.path.exists(os.path.join(OUTPUT_DIR, md))]
-if len(files_md) == len(files):
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "🗺️ Roteiro de Viagem",
-        "📖 Guia de Comunicação",
-        "📍 Relatório Cidade",
-        "✈️ Relatório Logística"
-    ])
-    with tab1: st.markdown(load_markdown(os.path.join(OUTPUT_DIR, "roteiro_viagem.md")))
-    with tab2: st.markdown(load_markdown(os.path.join(OUTPUT_DIR, "guia_comunicacao.md")))
-    with tab3: st.markdown(load_markdown(os.path.join(OUTPUT_DIR, "relatorio_local.md")))
-    with tab4: st.markdown(load_markdown(os.path.join(OUTPUT_DIR, "relatorio_logistica.md")))
+        # A geração roda em segundo plano: a página pode ser fechada ou recarregada.
+        try:
+            job_id = job_queue.submit(st.session_state.username, {
+                "from_city": from_city,
+                "destination_city": destination_city,
+                "date_from": date_from.isoformat(),
+                "date_to": date_to.isoformat(),
+                "interests": interests,
+            })
+        except QueueFull as e:
+            # Contrapressão: a fila está cheia ou o usuário já tem roteiros em andamento.
+            st.warning(f"⚠️ {e}")
+        else:
+            st.session_state['job_id'] = job_id
+            st.query_params["job"] = job_id
+            st.session_state.pop('history_trip', None)
+
+# --------------------------- RELATÓRIOS --------------------------- #
+
+# Abas na ordem de exibição (somente as dos relatórios já prontos aparecem).
+REPORT_TABS = {
+    "roteiro_viagem.md": "🗺️ Roteiro de Viagem",
+    "guia_comunicacao.md": "📖 Guia de Comunicação",
+    "relatorio_local.md": "📍 Relatório Cidade",
+    "relatorio_logistica.md": "✈️ Relatório Logística",
+}
+
+def render_reports(run_id, complete):
+    """Exibe os relatórios e PDFs já disponíveis. O ZIP só aparece com a viagem completa.
+
+    Retorna False se a execução ainda não tem nenhum relatório.
+    """
+    # Uma consulta traz nome, hash e tamanho de todos os artefatos da execução.
+    listing = artifact_store.listing(run_id)
+    files_md = [md for md in REPORT_TABS if md in listing]
+    if not files_md:
+        return False
+
+    tabs = st.tabs([REPORT_TABS[md] for md in files_md])
+    for tab, md_file in zip(tabs, files_md):
+        with tab:
+            st.markdown(session_report(artifact_store, run_id, md_file, listing[md_file]))
 
     st.divider()
     st.subheader("📥 Downloads")
 
+    # Os bytes vêm do cache em memória (por hash do conteúdo): um rerun não relê nem reempacota nada.
     for md_file, pdf_file in files.items():
-        pdf_path = os.path.join(OUTPUT_DIR, pdf_file)
-        if os.path.exists(pdf_path):
-            with open(pdf_path, "rb") as f:
-                st.download_button(
-                    label=f"📄 Baixar {pdf_file}",
-                    data=f,
-                    file_name=pdf_file,
-                    mime="application/pdf"
-                )
-
-    zip_path = os.path.join(OUTPUT_DIR, "pacote_viagem.zip")
-    shutil.make_archive(zip_path.replace(".zip", ""), 'zip', OUTPUT_DIR)
-    with open(zip_path, "rb") as f:
+        if pdf_file in listing:
+            st.download_button(
+                label=f"📄 Baixar {pdf_file}",
+                data=artifact_bytes(artifact_store, run_id, pdf_file, listing[pdf_file]),
+                file_name=pdf_file,
+                mime="application/pdf",
+                on_click="ignore"
+            )
+
+    if complete and all(pdf in listing for pdf in files.values()):
+        # Relatórios e PDFs da viagem; o ZIP só é remontado quando algum deles muda.
         st.download_button(
             label="📦 Baixar todos os arquivos (ZIP)",
-            data=f,
+            data=package_zip(artifact_store, run_id, listing),
             file_name="planejamento_viagem_completo.zip",
-            mime="application/zip"
+            mime="application/zip",
+            on_click="ignore"
         )
+    return True
+
+# --------------------------- HISTÓRICO DE VIAGENS --------------------------- #
+
+def history_sidebar():
+    """Busca (FTS5) nas viagens já geradas pelo usuário; um clique reabre a viagem."""
+    st.sidebar.divider()
+    st.sidebar.subheader("📚 Minhas viagens")
+    query = st.sidebar.text_input("Buscar no histórico", placeholder="destino, interesse ou atração")
+    trips = get_user_db().search_trips(st.session_state.username, query, limit=10)
+    if not trips:
+        st.sidebar.caption("Nenhuma viagem encontrada.")
+    for trip in trips:
+        label = f"{trip['destination']} · {trip['date_from']}"
+        if st.sidebar.button(label, key=f"trip_{trip['id']}", help=trip['snippet'] or trip['interests']):
+            st.session_state['history_trip'] = trip['id']
+
+def render_history_trip(trip_id):
+    """Reabre uma viagem do histórico, sem executar a crew novamente."""
+    trip = get_user_db().get_trip(st.session_state.username, trip_id)
+    if not trip:
+        st.session_state.pop('history_trip', None)
+        return
+    st.subheader(f"📚 {trip['from_city']} → {trip['destination']} ({trip['date_from']} a {trip['date_to']})")
+    st.caption(f"Interesses: {trip['interests']}")
+    files_md = [md for md in REPORT_TABS if md in trip["reports"]]
+    tabs = st.tabs([REPORT_TABS[md] for md in files_md])
+    for tab, md_file in zip(tabs, files_md):
+        with tab:
+            st.markdown(clean_markdown(trip["reports"][md_file]))
+            st.download_button(
+                label=f"📄 Baixar {md_file}",
+                data=trip["reports"][md_file],
+                file_name=md_file,
+                mime="text/markdown",
+                key=f"history_{trip_id}_{md_file}",
+                on_click="ignore"
+            )
+    if st.button("✖️ Fechar viagem do histórico"):
+        st.session_state.pop('history_trip', None)
+        st.rerun()
+    st.divider()
+
+history_sidebar()
+if st.session_state.get('history_trip'):
+    render_history_trip(st.session_state['history_trip'])
+
+# --------------------------- ACOMPANHAMENTO DO TRABALHO --------------------------- #
+
+@st.fragment(run_every=2)
+def job_status_panel(job_id):
+    """Consulta o trabalho periodicamente, exibe os relatórios já prontos e recarrega a página ao final."""
+    job = job_queue.get(job_id)
+    if job and job["status"] == QUEUED:
+        st.info(f"⏳ Aguardando na fila (posição {job_queue.queue_position(job_id)})...")
+    elif job and job["status"] in ACTIVE_STATUSES:
+        st.info(f"⏳ Montando seu roteiro... {job['progress']}")
+        if job.get("log"):
+            with st.expander("Acompanhar os agentes"):
+                st.text(job["log"])
+        render_reports(job_id, complete=False)
+    else:
+        st.rerun()
+
+# Recupera o trabalho da sessão, da URL ou, após um novo login, o último do usuário.
+job = current_job()
+job_active = bool(job and job["status"] in ACTIVE_STATUSES)
+if job:
+    if job_active:
+        job_status_panel(job["id"])
+    elif job["status"] == FAILED and st.session_state.get('job_notified') != job["id"]:
+        st.error(f"❌ Não foi possível gerar o roteiro: {job['error']}")
+        st.session_state['job_notified'] = job["id"]
+    elif job["status"] == DONE and st.session_state.get('job_notified') != job["id"]:
+        if (job["result"] or {}).get("from_cache"):
+            st.success("✅ Roteiro recuperado do cache!")
+        else:
+            st.success("✅ Roteiro gerado com sucesso!")
+            metrics = (job["result"] or {}).get("metrics")
+            if metrics:
+                st.caption(
+                    f"🔎 {sum(metrics['tool_calls'].values())} chamadas de ferramentas · "
+                    f"🧠 {metrics['llm_calls']} chamadas ao modelo "
+                    f"({'~' if metrics.get('estimated_llm_calls') else ''}"
+                    f"{metrics['prompt_tokens'] + metrics['completion_tokens']} tokens)"
+                )
+                waited = sum(limits["total_wait"] for limits in metrics.get("rate_limits", {}).values())
+                if waited >= 1:
+                    st.caption(f"⏳ {waited:.0f}s aguardando o limite de requisições das APIs")
+        st.session_state['job_notified'] = job["id"]
 
+if job and not job_active and render_reports(job["id"], complete=True):
     st.divider()
-    st.info("🤖 Desenvolvido por Vinicius Meireles | AgentAI Trip 2025")
\ No newline at end of file
+    st.info("🤖 Desenvolvido por Vinicius Meireles | AgentAI Trip 2025")
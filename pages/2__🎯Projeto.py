@@ -1,11 +1,11 @@
 import streamlit as st
+from trip_assets import inject_css, sidebar_logo
 
 st.set_page_config(page_title="Agentes de IA para Turismo", page_icon="🧠", layout="wide")
 
-with open('style.css')as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html = True)
+inject_css()
 
-st.sidebar.image("Img/logoAI.png", width=200)
+sidebar_logo()
 
 
 # ======================================
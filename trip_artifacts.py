@@ -0,0 +1,187 @@
+# Importa módulos da biblioteca padrão usados pelo armazenamento de artefatos.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+
+# Banco SQLite com os relatórios e PDFs de cada execução (compartilhado entre o app e os workers).
+ARTIFACTS_DB_PATH = os.getenv("TRIP_ARTIFACTS_DB", "artifacts.db")
+
+# Execuções mais antigas que isso, ou além do tamanho total, são descartadas.
+ARTIFACT_MAX_AGE = int(os.getenv("TRIP_ARTIFACT_MAX_AGE", 7 * 24 * 3600))
+ARTIFACT_MAX_BYTES = int(os.getenv("TRIP_ARTIFACT_MAX_BYTES", 500 * 1024 * 1024))
+
+# Metadados de um artefato: hash do conteúdo, tamanho e instante da última gravação.
+ArtifactInfo = namedtuple("ArtifactInfo", "digest size updated_at")
+
+# Relatórios gerados pelas tarefas e o PDF correspondente a cada um.
+REPORT_FILES = {
+    "roteiro_viagem.md": "roteiro_viagem.pdf",
+    "guia_comunicacao.md": "guia_comunicacao.pdf",
+    "relatorio_local.md": "relatorio_local.pdf",
+    "relatorio_logistica.md": "relatorio_logistica.pdf"
+}
+
+
+def clean_markdown(content):
+    """Remove as cercas ```markdown que o modelo às vezes coloca em volta do relatório."""
+    return content.replace("```markdown", "").replace("```", "")
+
+
+# ======================================================
+# CLASSE: ArtifactStore
+# Guarda os artefatos (Markdown e PDF) de cada execução como BLOBs no SQLite.
+# Cada execução (run) pertence a um usuário; o app e os workers leem e gravam
+# direto no banco, sem arquivos intermediários no diretório de trabalho.
+# ======================================================
+class ArtifactStore:
+    def __init__(self, path=None):
+        self.path = path or ARTIFACTS_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        # WAL: o app lê enquanto os workers gravam, sem bloqueio mútuo.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                run_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (run_id, name)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_user ON runs (username, created_at)")
+
+    # As linhas são lidas ainda com o lock: a conexão é compartilhada entre as threads.
+    def _execute(self, sql, args=()):
+        with self._lock:
+            self._conn.execute(sql, args)
+
+    def _fetchone(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchone()
+
+    def _fetchall(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    # --------------------------------------------------
+    # Execuções
+    # --------------------------------------------------
+    def workspace(self, run_id, username):
+        """Área de trabalho da execução, criada se ainda não existir. Só o dono tem acesso."""
+        now = time.time()
+        self._execute(
+            "INSERT OR IGNORE INTO runs (run_id, username, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (run_id, username, now, now),
+        )
+        owner = self.owner(run_id)
+        if owner != username:
+            raise PermissionError(f"A execução {run_id} pertence a outro usuário")
+        return Workspace(self, run_id)
+
+    def owner(self, run_id):
+        row = self._fetchone("SELECT username FROM runs WHERE run_id=?", (run_id,))
+        return row[0] if row else None
+
+    def delete_run(self, run_id, username):
+        """Remove a execução e seus artefatos, se ela pertencer ao usuário."""
+        if self.owner(run_id) != username:
+            return False
+        with self._lock:
+            self._conn.execute("DELETE FROM artifacts WHERE run_id=?", (run_id,))
+            self._conn.execute("DELETE FROM runs WHERE run_id=?", (run_id,))
+        return True
+
+    def evict(self, max_age=ARTIFACT_MAX_AGE, max_bytes=ARTIFACT_MAX_BYTES, keep=()):
+        """Descarta execuções antigas e, depois, as menos recentes até caber em `max_bytes`."""
+        keep = tuple(keep) or ("",)
+        marks = ",".join("?" * len(keep))
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                f"SELECT run_id FROM runs WHERE updated_at < ? AND run_id NOT IN ({marks})",
+                (time.time() - max_age, *keep),
+            )]
+            # Tamanho acumulado das execuções, da mais recente para a mais antiga.
+            oversized = [row[0] for row in self._conn.execute(f"""
+                SELECT run_id FROM (
+                    SELECT r.run_id, SUM(COALESCE(a.size, 0)) OVER (
+                        ORDER BY r.updated_at DESC, r.run_id ROWS UNBOUNDED PRECEDING
+                    ) AS total
+                    FROM runs r LEFT JOIN (
+                        SELECT run_id, SUM(size) AS size FROM artifacts GROUP BY run_id
+                    ) a ON a.run_id = r.run_id
+                ) WHERE total > ? AND run_id NOT IN ({marks})
+            """, (max_bytes, *keep))]
+            removed = set(expired) | set(oversized)
+            for run_id in removed:
+                self._conn.execute("DELETE FROM artifacts WHERE run_id=?", (run_id,))
+                self._conn.execute("DELETE FROM runs WHERE run_id=?", (run_id,))
+        return len(removed)
+
+    # --------------------------------------------------
+    # Artefatos
+    # --------------------------------------------------
+    def put(self, run_id, name, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (run_id, name, data, size, digest, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, name, data, len(data), digest, now),
+            )
+            self._conn.execute("UPDATE runs SET updated_at=? WHERE run_id=?", (now, run_id))
+        return digest
+
+    def read(self, run_id, name):
+        row = self._fetchone("SELECT data FROM artifacts WHERE run_id=? AND name=?", (run_id, name))
+        return row[0] if row else None
+
+    def listing(self, run_id):
+        """Metadados de todos os artefatos da execução (uma única consulta, sem ler os BLOBs)."""
+        rows = self._fetchall(
+            "SELECT name, digest, size, updated_at FROM artifacts WHERE run_id=?", (run_id,)
+        )
+        return {name: ArtifactInfo(digest, size, updated_at) for name, digest, size, updated_at in rows}
+
+
+# ======================================================
+# CLASSE: Workspace
+# Visão de uma única execução dentro do ArtifactStore.
+# ======================================================
+class Workspace:
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+
+    def write(self, name, data):
+        return self.store.put(self.run_id, name, data)
+
+    def read(self, name):
+        return self.store.read(self.run_id, name)
+
+    def read_text(self, name):
+        data = self.read(name)
+        return data.decode("utf-8") if data is not None else None
+
+    def exists(self, name):
+        return name in self.listing()
+
+    def listing(self):
+        return self.store.listing(self.run_id)
@@ -0,0 +1,68 @@
+# Importa o módulo os para ler configurações via variáveis de ambiente.
+import os
+
+# Importa o Streamlit (cache por processo e estado da sessão).
+import streamlit as st
+
+# Importa a limpeza do Markdown dos relatórios (sem carregar a pilha de PDF).
+from trip_artifacts import clean_markdown
+
+# Importa o cache LRU endereçado por hash, usado também para os relatórios da sessão.
+from trip_package import ArtifactCache
+
+
+# Arquivos estáticos compartilhados pelas páginas.
+STYLE_PATH = "style.css"
+SIDEBAR_LOGO = "Img/logoAI.png"
+
+# Tamanho máximo (em caracteres) dos relatórios processados guardados por sessão.
+SESSION_REPORT_CACHE_MAX_CHARS = int(os.getenv("TRIP_SESSION_REPORT_CACHE_MAX_CHARS", 4 * 1024 * 1024))
+
+
+# ======================================================
+# ARQUIVOS ESTÁTICOS
+# CSS, logos e ícones são lidos uma única vez por processo e reaproveitados
+# por todas as sessões e reruns.
+# ======================================================
+@st.cache_resource(show_spinner=False)
+def stylesheet(path=STYLE_PATH):
+    with open(path, encoding="utf-8") as f:
+        return f"<style>{f.read()}</style>"
+
+
+@st.cache_resource(show_spinner=False)
+def image_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def inject_css(path=STYLE_PATH):
+    """Aplica o CSS do app na página atual."""
+    st.markdown(stylesheet(path), unsafe_allow_html=True)
+
+
+def sidebar_logo(path=SIDEBAR_LOGO, width=200):
+    st.sidebar.image(image_bytes(path), width=width)
+
+
+def image(path, **kwargs):
+    """`st.image` a partir dos bytes já carregados."""
+    st.image(image_bytes(path), **kwargs)
+
+
+# ======================================================
+# RELATÓRIOS DA SESSÃO
+# Cada sessão guarda o conteúdo já processado dos relatórios, chaveado pelo
+# hash do conteúdo: o banco só é lido quando o relatório muda. O cache é LRU e
+# limitado, para o histórico de viagens abertas não crescer sem fim na sessão.
+# ======================================================
+def session_report(store, run_id, name, info):
+    """Texto do relatório da execução, memorizado na sessão (`info` vem de `store.listing`)."""
+    if "_session_reports" not in st.session_state:
+        st.session_state["_session_reports"] = ArtifactCache(SESSION_REPORT_CACHE_MAX_CHARS)
+
+    def load():
+        data = store.read(run_id, name)
+        return clean_markdown(data.decode("utf-8")) if data is not None else None
+
+    return st.session_state["_session_reports"].fetch(info.digest, load)
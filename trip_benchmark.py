@@ -0,0 +1,296 @@
+# ==========================================================
+# 📏 AgentAI Trip - Benchmark offline
+# Executa o TripCrew com um LLM falso (determinístico) e buscas falsas com
+# latência configurável, sem OpenAI nem Tavily, e mede:
+#   - latência ponta a ponta e tempo de cada tarefa;
+#   - chamadas de ferramentas e tamanho dos prompts;
+#   - vazão da geração de PDF em memória (a mesma do app) em relatórios sintéticos de tamanho crescente,
+#     um a um e todos ao mesmo tempo no pool de PDFs (TRIP_PDF_WORKERS / --pdf-workers).
+# O resultado é gravado em JSON, para comparar versões do pipeline.
+#
+# Uso: python trip_benchmark.py --runs 3 --llm-latency 0.2 --search-latency 0.5
+# ==========================================================
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+# Todo o estado persistente (caches, bases e limitador) vai para uma pasta temporária,
+# para o benchmark não usar nem alterar os bancos reais do app. Precisa ser definido
+# antes de importar os módulos do app, que leem essas variáveis ao serem importados.
+WORKDIR = tempfile.mkdtemp(prefix="trip-bench-")
+os.environ["TRIP_CACHE_DB"] = os.path.join(WORKDIR, "cache.db")
+os.environ["TRIP_DESTINATIONS_DB"] = os.path.join(WORKDIR, "destinations.db")
+os.environ["TRIP_USERS_DB"] = os.path.join(WORKDIR, "users.db")
+os.environ["TRIP_RATE_LIMIT_DB"] = ""
+os.environ.setdefault("TRIP_TRACE_FILE", os.path.join(WORKDIR, "traces.jsonl"))
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+
+from crewai import LLM
+
+import trip_pdf
+import trip_tools
+from trip_crew import DAG, SEQUENTIAL, TripCrew
+from trip_destinations import shared_destination_store
+from trip_events import LLMCalled, RunMetrics, bus, emit, run_context
+from trip_llm import prompt_text
+from trip_ratelimit import estimate_tokens
+from trip_pdf import render_timed, submit_render
+
+
+# Tamanhos (em KB) dos relatórios sintéticos usados no teste de PDF.
+PDF_SIZES_KB = (1, 10, 50, 200)
+
+
+# ======================================================
+# RELATÓRIO SINTÉTICO
+# ======================================================
+def synthetic_report(title, size_kb=2):
+    """Relatório Markdown determinístico com títulos, listas e parágrafos, com ~`size_kb` KB."""
+    sections = ["Resumo", "Custos", "Segurança", "Costumes", "Destaques", "Dia a dia"]
+    lines = [f"# {title}", ""]
+    block = 0
+    while len("\n".join(lines)) < size_kb * 1024:
+        lines.append(f"## {sections[block % len(sections)]} {block // len(sections) + 1}")
+        lines.append("")
+        lines.append(
+            f"O bloco {block} descreve **atrações**, horários e *dicas práticas* para o viajante, "
+            "com estimativas de custo em moeda local e sugestões de deslocamento entre bairros."
+        )
+        lines.append("")
+        for item in range(5):
+            lines.append(f"- Item {item + 1} do bloco {block}: visita, transporte e refeição (R$ {50 + item * 10})")
+        lines.append("")
+        block += 1
+    return "\n".join(lines)
+
+
+# ======================================================
+# CLASSE: FakeLLM
+# LLM do CrewAI que responde no formato ReAct sem acessar a rede: usa a
+# primeira ferramenta disponível `tool_calls` vezes e depois entrega um
+# relatório sintético como resposta final.
+# ======================================================
+class FakeLLM(LLM):
+    def __init__(self, latency=0.0, tool_calls=2, report_kb=2, **kwargs):
+        super().__init__(model="fake-llm", **kwargs)
+        self.latency = latency
+        self.tool_calls = tool_calls
+        self.report_kb = report_kb
+
+    def supports_function_calling(self):
+        return False
+
+    def supports_stop_words(self):
+        return True
+
+    def get_context_window_size(self):
+        return 128000
+
+    def call(self, messages, *args, **kwargs):
+        prompt = prompt_text(messages)
+        started = time.perf_counter()
+        time.sleep(self.latency)
+
+        # Cada observação de ferramenta fica em uma mensagem do assistente na conversa.
+        observations = sum(
+            1 for m in messages
+            if isinstance(m, dict) and m.get("role") == "assistant" and "Observation:" in m.get("content", "")
+        ) if not isinstance(messages, str) else 0
+        tools = re.findall(r"^Tool Name: (.+)$", prompt, flags=re.MULTILINE)
+
+        if tools and observations < self.tool_calls:
+            query = f"consulta {observations + 1} " + " ".join(prompt.split()[-6:])
+            response = (
+                f"Thought: Preciso pesquisar mais informações.\n"
+                f"Action: {tools[0].strip()}\n"
+                f"Action Input: {json.dumps({'query': query}, ensure_ascii=False)}"
+            )
+        else:
+            response = (
+                "Thought: Já tenho as informações necessárias.\n"
+                f"Final Answer: {synthetic_report('Relatório sintético', self.report_kb)}"
+            )
+
+        emit(
+            LLMCalled, model=self.model, prompt_tokens=estimate_tokens(prompt),
+            completion_tokens=estimate_tokens(response), duration=time.perf_counter() - started, estimated=True,
+        )
+        return response
+
+
+# ======================================================
+# BUSCA FALSA
+# Substitui os provedores em `trip_tools.SEARCH_PROVIDERS`, mantendo todo o
+# caminho real das ferramentas (hedge, lote, cache e eventos).
+# ======================================================
+def fake_search(provider, latency):
+    def run(query):
+        started = time.perf_counter()
+        time.sleep(latency)
+        # Registra a requisição como os provedores reais (alimenta o hedge e o relatório de tempos).
+        trip_tools.tool_timings.record(provider, "request", time.perf_counter() - started)
+        return [
+            {"title": f"Resultado {i} para {query}",
+             "url": f"https://example.com/{hashlib.md5(query.encode()).hexdigest()[:8]}/{i}",
+             "content": f"Conteúdo sintético {i} sobre {query}."}
+            for i in range(3)
+        ]
+
+    return run
+
+
+def install_fake_search(latency):
+    for provider in trip_tools.SEARCH_PROVIDERS:
+        trip_tools.SEARCH_PROVIDERS[provider] = fake_search(provider, latency)
+
+
+def reset_state():
+    """Limpa caches e a base de destinos entre execuções, para todas medirem o caminho completo."""
+    for cache in trip_tools.search_caches.values():
+        cache.clear()
+    trip_tools.tool_timings.reset()
+    # A base de destinos é compartilhada pelo processo: limpa pela própria conexão.
+    shared_destination_store().clear()
+
+
+# ======================================================
+# MEDIÇÕES
+# ======================================================
+def bench_crew(args):
+    """Executa o TripCrew `args.runs` vezes e retorna as medições de cada execução."""
+    install_fake_search(args.search_latency)
+    llm = FakeLLM(latency=args.llm_latency, tool_calls=args.tool_calls, report_kb=args.report_kb)
+    runs = []
+    for index in range(args.runs):
+        reset_state()
+        metrics = RunMetrics()
+        prompts = []
+
+        def on_llm(event, prompts=prompts):
+            if isinstance(event, LLMCalled):
+                prompts.append(event.prompt_tokens)
+
+        started = time.perf_counter()
+        with run_context() as run_id, bus.subscribed(run_id, metrics), bus.subscribed(run_id, on_llm):
+            TripCrew("São Paulo", "Lisboa", "2025-05-10", "2025-05-15", "museus, gastronomia",
+                     mode=args.mode, llm=llm).run()
+        elapsed = time.perf_counter() - started
+
+        snapshot = metrics.snapshot()
+        runs.append({
+            "run": index + 1,
+            "wall_time": round(elapsed, 3),
+            "task_durations": snapshot["task_durations"],
+            "tool_calls": snapshot["tool_calls"],
+            "tool_time": snapshot["tool_time"],
+            "llm_calls": snapshot["llm_calls"],
+            "prompt_tokens": {
+                "total": sum(prompts),
+                "mean": round(statistics.mean(prompts), 1) if prompts else 0,
+                "max": max(prompts, default=0),
+            },
+            "task_tokens": snapshot["task_tokens"],
+            "cache": snapshot["cache"],
+            "rate_limits": snapshot["rate_limits"],
+            "tool_timings": trip_tools.tool_timings.snapshot(),
+        })
+        print(f"Execução {index + 1}: {elapsed:.2f}s")
+    return runs
+
+
+def bench_pdf(sizes_kb=PDF_SIZES_KB):
+    """Mede a geração de PDF em memória em relatórios sintéticos de tamanho crescente, um a um e todos juntos."""
+    results = []
+    reports = []
+    for size_kb in sizes_kb:
+        name = f"bench_{size_kb}kb.md"
+        markdown = synthetic_report(f"Relatório de {size_kb} KB", size_kb)
+        timing = render_timed(name, markdown)
+        md_bytes = len(markdown.encode("utf-8"))
+        reports.append((name, markdown))
+        results.append({
+            "markdown_bytes": md_bytes,
+            "pdf_bytes": timing["bytes"],
+            "seconds": timing["seconds"],
+            "kb_per_second": round(md_bytes / 1024 / timing["seconds"], 1) if timing["seconds"] else None,
+        })
+        print(f"PDF {size_kb} KB: {timing['seconds']:.3f}s")
+
+    # Todos os relatórios agendados de uma vez, pelo mesmo caminho usado nos trabalhos (submit_render).
+    # Só há conversão simultânea com mais de um processo de PDF; com 1, a fila é atendida em ordem.
+    workers = trip_pdf.PDF_WORKERS
+    for future in [submit_render(*reports[0]) for _ in range(max(1, workers))]:
+        future.result()  # aquece o pool (todos os processos)
+    started = time.perf_counter()
+    futures = [submit_render(name, markdown) for name, markdown in reports]
+    batch = [{key: value for key, value in future.result().items() if key != "data"} for future in futures]
+    elapsed = time.perf_counter() - started
+    print(f"PDF com {workers} worker(s) ({len(reports)} documentos): {elapsed:.3f}s")
+    return {
+        "documents": results,
+        "pdf_workers": workers,
+        "sequential_seconds": round(sum(result["seconds"] for result in results), 4),
+        "batch_seconds": round(elapsed, 4),
+        "batch_documents": batch,
+    }
+
+
+def summarize(runs):
+    walls = [run["wall_time"] for run in runs]
+    tasks = {}
+    for run in runs:
+        for name, seconds in run["task_durations"].items():
+            tasks.setdefault(name, []).append(seconds)
+    return {
+        "wall_time_mean": round(statistics.mean(walls), 3) if walls else 0,
+        "wall_time_min": min(walls, default=0),
+        "wall_time_max": max(walls, default=0),
+        "task_time_mean": {name: round(statistics.mean(values), 3) for name, values in tasks.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do AgentAI Trip")
+    parser.add_argument("--runs", type=int, default=3, help="execuções completas do TripCrew")
+    parser.add_argument("--mode", choices=(DAG, SEQUENTIAL), default=DAG, help="modo de execução do TripCrew")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="latência simulada de cada chamada ao LLM (s)")
+    parser.add_argument("--search-latency", type=float, default=0.5, help="latência simulada de cada busca (s)")
+    parser.add_argument("--tool-calls", type=int, default=2, help="chamadas de ferramenta por tarefa")
+    parser.add_argument("--report-kb", type=int, default=2, help="tamanho de cada relatório gerado pelo LLM falso")
+    parser.add_argument("--skip-pdf", action="store_true", help="não mede a conversão para PDF")
+    parser.add_argument("--pdf-workers", type=int, default=None,
+                        help="processos de PDF no teste em lote (padrão: TRIP_PDF_WORKERS)")
+    parser.add_argument("--output", default="benchmark.json", help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    # Qualquer arquivo gravado com caminho relativo durante o benchmark fica na pasta temporária.
+    output = os.path.abspath(args.output)
+    os.chdir(WORKDIR)
+
+    if args.pdf_workers is not None:
+        trip_pdf.PDF_WORKERS = args.pdf_workers
+    runs = bench_crew(args)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "runs": runs,
+        "summary": summarize(runs),
+        "pdf": None if args.skip_pdf else bench_pdf(),
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {output}")
+
+
+if __name__ == "__main__":
+    main()
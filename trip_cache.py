@@ -0,0 +1,325 @@
+# Importa módulos da biblioteca padrão usados pelo cache persistente.
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Importa o evento publicado a cada consulta (acertos e faltas contados por execução).
+from trip_events import CacheLooked, emit
+
+
+# Caminho do banco SQLite onde os caches ficam gravados (pode ser alterado via variável de ambiente).
+CACHE_DB_PATH = os.getenv("TRIP_CACHE_DB", "cache.db")
+
+
+# ======================================================
+# FUNÇÕES AUXILIARES
+# ======================================================
+def normalize_query(query):
+    """Normaliza uma consulta para que variações triviais usem a mesma chave de cache."""
+    # Unifica a representação Unicode e remove acentos ("São Paulo" == "sao paulo").
+    text = unicodedata.normalize("NFKD", str(query or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    # Minúsculas, espaços colapsados e pontuação final descartada.
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return text.strip(" ?!.;,")
+
+
+# ======================================================
+# CLASSE: PersistentCache
+# Cache chave/valor gravado em SQLite, com TTL por entrada e limite LRU
+# de tamanho. Cada consulta publica CacheLooked (acerto/falta) na execução
+# atual. Seguro para uso entre threads.
+# ======================================================
+class PersistentCache:
+    def __init__(self, namespace, ttl=24 * 3600, max_entries=1000, path=None, max_bytes=None):
+        # O namespace separa caches diferentes dentro do mesmo arquivo.
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Limite opcional do tamanho total (em bytes) das entradas do namespace.
+        self.max_bytes = max_bytes
+        self.path = path or CACHE_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache_entries (namespace, last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key, default=None):
+        """Retorna o valor armazenado ou `default` se a chave não existir ou tiver expirado."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace=? AND key=?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None and row[1] < now:
+                # Entrada vencida: remove para liberar espaço.
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace=? AND key=?", (self.namespace, key)
+                )
+                self._conn.commit()
+                row = None
+            elif row is not None:
+                # Atualiza o último acesso, usado pela política LRU.
+                self._conn.execute(
+                    "UPDATE cache_entries SET last_access=? WHERE namespace=? AND key=?",
+                    (now, self.namespace, key),
+                )
+                self._conn.commit()
+        emit(CacheLooked, cache=self.namespace, hit=row is not None)
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        """Grava um valor com TTL próprio (ou o TTL padrão do cache)."""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        blob = pickle.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, blob, now, expires_at, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Remove entradas vencidas e, se necessário, as menos usadas recentemente."""
+        self._conn.execute(
+            "DELETE FROM cache_entries WHERE namespace=? AND expires_at < ?", (self.namespace, now)
+        )
+        self._conn.execute(
+            """
+            DELETE FROM cache_entries WHERE namespace=? AND key IN (
+                SELECT key FROM cache_entries WHERE namespace=?
+                ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.namespace, self.namespace, self.max_entries),
+        )
+        if self.max_bytes:
+            # Mantém as entradas mais recentes cuja soma de tamanhos cabe no limite.
+            self._conn.execute(
+                """
+                DELETE FROM cache_entries WHERE namespace=? AND key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(length(value)) OVER (ORDER BY last_access DESC) AS running
+                        FROM cache_entries WHERE namespace=?
+                    ) WHERE running > ?
+                )
+                """,
+                (self.namespace, self.namespace, self.max_bytes),
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace=? AND key=?", (self.namespace, key)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace=?", (self.namespace,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace=?", (self.namespace,)
+            ).fetchone()[0]
+
+
+# ======================================================
+# CACHE SEMÂNTICO
+# Reaproveita respostas do LLM para pedidos parecidos (ex: "museus e gastronomia"
+# e "gastronomia e museus"). A chave exata (origem, destino, datas e o restante
+# do prompt) precisa ser idêntica; a similaridade de cosseno compara apenas o
+# texto livre dos interesses.
+# ======================================================
+
+# Palavras muito comuns que não ajudam a diferenciar prompts.
+STOPWORDS = frozenset(
+    "a o e de da do das dos em no na nos nas um uma para por com que se the and of to in for".split()
+)
+
+
+def local_embedding(text):
+    """Embedding local e determinístico (saco de palavras), sem chamadas de rede.
+
+    Retorna um vetor esparso {termo: peso} com norma 1.
+    """
+    counts = {}
+    for token in re.findall(r"[a-z]+", normalize_query(text)):
+        if token not in STOPWORDS:
+            counts[token] = counts.get(token, 0) + 1
+    norm = sum(value * value for value in counts.values()) ** 0.5 or 1.0
+    return {token: value / norm for token, value in counts.items()}
+
+
+def openai_embedding(text, model="text-embedding-3-small"):
+    """Embedding via API (LiteLLM), no mesmo formato esparso do embedding local."""
+    import litellm
+
+    vector = litellm.embedding(model=model, input=[text]).data[0]["embedding"]
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return {str(i): value / norm for i, value in enumerate(vector)}
+
+
+def cosine(a, b):
+    """Similaridade de cosseno entre dois vetores esparsos já normalizados."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(key, 0.0) for key, value in a.items())
+
+
+def trip_scope(from_city, destination_city, date_from, date_to):
+    """Parte exata da chave do cache semântico: origem, destino e datas normalizados."""
+    return "|".join([normalize_query(from_city), normalize_query(destination_city), str(date_from), str(date_to)])
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.95, ttl=7 * 24 * 3600, max_entries=2000, embed=None, path=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed or local_embedding
+        self.path = path or CACHE_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                vector TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_semantic_lookup ON semantic_entries (namespace, signature)"
+        )
+        self._conn.commit()
+
+    def lookup(self, namespace, key, text):
+        """Resposta gravada com a mesma `key` cujo `text` é o mais parecido (acima do limiar), ou None."""
+        now = time.time()
+        vector = self.embed(text)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, vector, response FROM semantic_entries "
+                "WHERE namespace=? AND signature=? AND expires_at >= ?",
+                (namespace, key, now),
+            ).fetchall()
+            best_id, best_score, best_response = None, self.threshold, None
+            for entry_id, stored, response in rows:
+                score = cosine(vector, json.loads(stored))
+                if score >= best_score:
+                    best_id, best_score, best_response = entry_id, score, response
+            if best_id is not None:
+                self._conn.execute("UPDATE semantic_entries SET last_access=? WHERE id=?", (now, best_id))
+                self._conn.commit()
+        emit(CacheLooked, cache=namespace, hit=best_id is not None)
+        return best_response
+
+    def store(self, namespace, key, text, response):
+        """Grava a resposta e aplica a política de despejo (TTL + LRU por namespace)."""
+        now = time.time()
+        vector = json.dumps(self.embed(text))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO semantic_entries "
+                "(namespace, signature, vector, response, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, key, vector, response, now, now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM semantic_entries WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                """
+                DELETE FROM semantic_entries WHERE namespace=? AND id IN (
+                    SELECT id FROM semantic_entries WHERE namespace=?
+                    ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (namespace, namespace, self.max_entries),
+            )
+            self._conn.commit()
+
+
+# ======================================================
+# CACHE DE VIAGENS COMPLETAS
+# Guarda os quatro relatórios (markdown e PDF) de uma viagem, indexados pela
+# forma canônica dos parâmetros do pedido.
+# ======================================================
+
+TRIP_CACHE_TTL = int(os.getenv("TRIP_RESULT_CACHE_TTL", 3 * 24 * 3600))
+TRIP_CACHE_MAX_ENTRIES = int(os.getenv("TRIP_RESULT_CACHE_MAX_ENTRIES", 200))
+TRIP_CACHE_MAX_BYTES = int(os.getenv("TRIP_RESULT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+
+def canonical_interests(interests):
+    """Interesses como conjunto ordenado de termos ("museus e gastronomia" == "gastronomia, museus")."""
+    terms = re.split(r"[,;/\n]|\s+e\s+|\s+and\s+|\s+&\s+", normalize_query(interests))
+    return sorted({term.strip(" .") for term in terms if term.strip(" .")})
+
+
+def trip_cache_key(from_city, destination_city, date_from, date_to, interests):
+    """Chave canônica de um pedido de viagem."""
+    parts = [
+        normalize_query(from_city),
+        normalize_query(destination_city),
+        str(date_from),
+        str(date_to),
+        ",".join(canonical_interests(interests)),
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class TripResultCache(PersistentCache):
+    def __init__(self, path=None):
+        super().__init__(
+            "trip", ttl=TRIP_CACHE_TTL, max_entries=TRIP_CACHE_MAX_ENTRIES, path=path, max_bytes=TRIP_CACHE_MAX_BYTES
+        )
+
+    def save(self, key, workspace, files):
+        """Lê os markdowns e PDFs do workspace da execução (pares de `files`) e grava no cache."""
+        entry = {}
+        for md_file, pdf_file in files.items():
+            for name in (md_file, pdf_file):
+                content = workspace.read(name)
+                if content is None:
+                    # Viagens incompletas não são guardadas.
+                    return False
+                entry[name] = content
+        self.set(key, entry)
+        return True
+
+    def restore(self, key, workspace):
+        """Grava no workspace da execução os artefatos de uma viagem em cache. Retorna False se não houver."""
+        entry = self.get(key)
+        if entry is None:
+            return False
+        for name, content in entry.items():
+            workspace.write(name, content)
+        return True
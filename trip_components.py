@@ -1,13 +1,23 @@
 # Importa classes principais da biblioteca CrewAI
 # Agent: representa um agente inteligente com um papel e objetivo
 # Task: define uma tarefa a ser executada por um agente
-# LLM: representa o modelo de linguagem usado pelo agente
-from crewai import Agent, Task, LLM
+# (o modelo de linguagem vem de trip_llm, que estende o LLM do CrewAI)
+from crewai import Agent, Task
 
 # Importa ferramentas personalizadas criadas no módulo 'trip_tools'
 # SearchTools: para realizar buscas externas
 # CalculatorTools: para cálculos, como estimativas de custo
-from trip_tools import SearchTools, CalculatorTools
+# HistoryTools: para consultar roteiros anteriores do usuário
+from trip_tools import SearchTools, CalculatorTools, HistoryTools
+
+# Importa os LLMs com limite de taxa (e cache semântico) e a configuração de opt-in por tarefa.
+from trip_llm import CachedLLM, TripLLM, semantic_cache_enabled
+
+# Importa a parte exata da chave do cache semântico (origem, destino e datas).
+from trip_cache import trip_scope
+
+# Importa a função que publica os passos de cada agente no barramento de eventos.
+from trip_events import observe_steps
 
 # Importa a função dedent, usada para remover indentação extra de textos multilinha
 from textwrap import dedent
@@ -24,19 +34,43 @@ load_dotenv()
 # Define diferentes agentes com papéis específicos no planejamento de viagem.
 # ======================================================
 class TripAgents:
-    def __init__(self):
+    def __init__(self, llm=None, trip=None):
+        # Um LLM injetado (ex: o modelo falso do benchmark) substitui o da OpenAI em todos os agentes.
+        self.injected_llm = llm
+        # Parâmetros do pedido (from_city, destination_city, date_from, date_to, interests):
+        # delimitam o cache semântico. Sem eles, nenhuma resposta é reaproveitada.
+        self.trip = trip
+
         # Inicializa o modelo de linguagem chatgpt, da Openai, com a chave da API.
         # Esse modelo será compartilhado por todos os agentes.
-        self.chatgpt = LLM(
+        # TripLLM respeita o limite de requisições/tokens por minuto compartilhado entre execuções.
+        self.chatgpt = llm or TripLLM(
             model="gpt-4o-mini",  # Define qual modelo da Openai será usado
             api_key=os.getenv("OPENAI_API_KEY"),  # Busca a chave no arquivo .env
         )
 
+    def llm_for(self, task):
+        """Retorna o LLM do agente: com cache semântico se a tarefa optou por ele."""
+        if self.injected_llm is not None or self.trip is None or not semantic_cache_enabled(task):
+            return self.chatgpt
+        # Cada tarefa tem seu próprio namespace, para não misturar respostas entre agentes;
+        # origem, destino e datas precisam ser idênticos, só os interesses podem variar.
+        return CachedLLM(
+            model="gpt-4o-mini",
+            api_key=os.getenv("OPENAI_API_KEY"),
+            cache_namespace=f"llm:{task}",
+            cache_scope=trip_scope(
+                self.trip["from_city"], self.trip["destination_city"], self.trip["date_from"], self.trip["date_to"]
+            ),
+            cache_interests=self.trip["interests"],
+        )
+
     # --------------------------------------------------
     # Agente 1: Especialista em informações da cidade
     # --------------------------------------------------
     def city_info_agent(self):
-        return Agent(
+        # observe_steps publica cada passo do agente (pensamento e ferramenta escolhida) no barramento de eventos
+        return observe_steps(Agent(
             # Função principal do agente
             role="Especialista em informações da cidade",
 
@@ -56,11 +90,12 @@ class TripAgents:
                 """
             ),
 
-            # Modelo de linguagem a ser usado (chatgpt)
-            llm=self.chatgpt,
+            # Modelo de linguagem a ser usado (chatgpt, com cache semântico se habilitado)
+            llm=self.llm_for("city_info"),
 
             # Ferramentas auxiliares disponíveis — neste caso, busca por informações
-            tools=[SearchTools.search_tavily],
+            # (individual ou em lote, para várias consultas no mesmo turno)
+            tools=[SearchTools.search_web, SearchTools.search_many],
 
             # Mostra logs detalhados durante a execução
             verbose=True,
@@ -70,13 +105,13 @@ class TripAgents:
 
             # Impede que o agente delegue sua tarefa a outro agente
             allow_delegation=False,
-      )
+      ))
 
     # --------------------------------------------------
     # Agente 2: Especialista em logística de viagem
     # --------------------------------------------------
     def logistics_expert_agent(self):
-        return Agent(
+        return observe_steps(Agent(
             role="Especialista em logística de viagem",  # Função do agente
             goal="Identificar as melhores opções logísticas para a viagem, com foco em praticidade, custo-benefício e conforto.",  # Objetivo
             backstory=dedent(
@@ -85,21 +120,22 @@ class TripAgents:
                 Tenho conhecimento sobre companhias aéreas, apps de mobilidade, regiões seguras para se hospedar e otimização de trajetos.
                 """
             ),
-            llm=self.chatgpt,  # Modelo de linguagem
+            llm=self.llm_for("plan_logistics"),  # Modelo de linguagem
             tools=[
-                SearchTools.search_tavily,  # Ferramenta de busca
+                SearchTools.search_web,  # Ferramenta de busca
+                SearchTools.search_many,    # Busca em lote (várias consultas em paralelo)
                 CalculatorTools.calculate   # Ferramenta de cálculo de custos
             ],
             verbose=True,
             max_iter=10,
             allow_delegation=False,
-        )
+        ))
 
     # --------------------------------------------------
     # Agente 3: Planejador de itinerário personalizado
     # --------------------------------------------------
     def itinerary_planner_agent(self):
-        return Agent(
+        return observe_steps(Agent(
             role="Planejador de itinerário personalizado",
             goal="Criar um roteiro completo com base nas preferências do usuário.",
             backstory=dedent(
@@ -108,18 +144,19 @@ class TripAgents:
                 Minha missão é integrar dados sobre clima, atrações, eventos e logística em uma experiência otimizada para o turista.
                 """
             ),
-            llm=self.chatgpt,
-            tools=[SearchTools.search_tavily],
+            llm=self.llm_for("build_itinerary"),
+            # O histórico vem primeiro: adaptar um roteiro anterior evita novas buscas.
+            tools=[HistoryTools.search_past_trips, SearchTools.search_web, SearchTools.search_many],
             verbose=True,
             max_iter=10,
             allow_delegation=False,
-        )
+        ))
 
     # --------------------------------------------------
     # Agente 4: Guia de idioma e etiqueta local
     # --------------------------------------------------
     def language_guide_agent(self):
-        return Agent(
+        return observe_steps(Agent(
             role="Especialista em comunicação e etiqueta local",
             goal="Gerar um guia traduzido com frases úteis, dicas de etiqueta e expressões práticas com base nas atividades do roteiro.",
             backstory=dedent(
@@ -130,12 +167,12 @@ class TripAgents:
                 Também forneço dicas culturais para evitar gafes e tornar a experiência mais fluida e respeitosa.
                 """
             ),
-            llm=self.chatgpt,
-            tools=[SearchTools.search_tavily],
+            llm=self.llm_for("language_guide"),
+            tools=[SearchTools.search_web],
             verbose=True,
             max_iter=5,
             allow_delegation=False,
-        )
+        ))
 
 
 # ======================================================
@@ -146,7 +183,14 @@ class TripTasks:
     # --------------------------------------------------
     # Tarefa 1: Coletar informações da cidade
     # --------------------------------------------------
-    def city_info_task(self, agent, from_city, destination_city, interests, date_from, date_to):
+    def city_info_task(self, agent, from_city, destination_city, interests, date_from, date_to, known_sections=None,
+                       callback=None):
+        # Se a base de destinos já tem as seções genéricas da cidade, o agente
+        # só precisa pesquisar o que depende dos interesses e das datas.
+        if known_sections:
+            return self.city_specifics_task(
+                agent, from_city, destination_city, interests, date_from, date_to, known_sections, callback
+            )
         return Task(
             # Descrição detalhada da tarefa
             description=dedent(
@@ -181,14 +225,78 @@ class TripTasks:
             # Agente responsável por executar a tarefa
             agent=agent,
 
-            # Nome do arquivo onde o resultado será salvo
-            output_file='relatorio_local.md',
+            # Nome do relatório no workspace da execução (nada é gravado no diretório atual)
+            name='relatorio_local.md',
+
+            # Função chamada assim que a tarefa termina (exibição progressiva no app)
+            callback=callback,
+        )
+
+    # --------------------------------------------------
+    # Tarefa 1 (incremental): apenas a parte específica do relatório da cidade
+    # --------------------------------------------------
+    def city_specifics_task(self, agent, from_city, destination_city, interests, date_from, date_to, known_sections,
+                            callback=None):
+        known = "\n\n".join(known_sections.values())
+        return Task(
+            description=dedent(
+                f"""
+                As informações gerais sobre a cidade (resumo, custos, segurança e costumes) já foram levantadas
+                e estão abaixo. NÃO pesquise esses temas novamente.
+                Concentre-se apenas no que depende do viajante: marcos culturais, pontos históricos, entretenimento,
+                gastronomia e atividades alinhadas às preferências, além de eventos e festivais nas datas da visita.
+                Use as ferramentas disponíveis para buscar fontes atualizadas e confiáveis.
+
+                Viajando de: {from_city}
+                Para: {destination_city}
+                Interesses do viajante: {interests}
+                Chegada: {date_from}
+                Partida: {date_to}
+
+                Informações gerais já conhecidas (apenas para referência):
+                {known}
+                """
+            ),
+            expected_output=dedent(
+                """
+                Um trecho de guia (em formato markdown) em português, começando com um título de nível 2, que inclui:
+                - Uma lista selecionada de lugares recomendados para visitar, alinhados aos interesses;
+                - Eventos e festivais durante as datas da viagem (se houver);
+                """
+            ),
+            agent=agent,
+            name='relatorio_local.md',
+            callback=callback,
+        )
+
+    # --------------------------------------------------
+    # Tarefa auxiliar: perfil genérico do destino (atualização da base de destinos)
+    # --------------------------------------------------
+    def destination_profile_task(self, agent, destination_city):
+        return Task(
+            description=dedent(
+                f"""
+                Levantar informações gerais e atualizadas sobre {destination_city}, que sirvam para qualquer viajante:
+                resumo da cidade e da sua cultura, custos médios do dia a dia, segurança e costumes locais.
+                Use as ferramentas disponíveis para buscar fontes atualizadas e confiáveis.
+                """
+            ),
+            expected_output=dedent(
+                """
+                Um guia (em formato markdown) em português com exatamente estas seções de nível 2:
+                ## Resumo da cidade e cultura
+                ## Despesas diárias
+                ## Recomendações de segurança
+                ## Dicas de costumes locais
+                """
+            ),
+            agent=agent,
         )
 
     # --------------------------------------------------
     # Tarefa 2: Planejar logística da viagem
     # --------------------------------------------------
-    def plan_logistics_task(self, context, agent, destination_city, interests, date_from, date_to):
+    def plan_logistics_task(self, context, agent, destination_city, interests, date_from, date_to, callback=None):
         return Task(
             description=dedent(
                 f"""
@@ -212,15 +320,16 @@ class TripTasks:
                 - Estimativas de custo para cada item;
                 """
             ),
-            context=context,  # Contexto anterior (informações da cidade)
+            context=context,  # Contexto anterior (pode ser vazio: só precisa de destino e datas)
             agent=agent,      # Agente responsável
-            output_file='relatorio_logistica.md',
+            name='relatorio_logistica.md',
+            callback=callback,
         )
 
     # --------------------------------------------------
     # Tarefa 3: Criar o roteiro da viagem
     # --------------------------------------------------
-    def build_itinerary_task(self, context, agent, destination_city, interests, date_from, date_to):
+    def build_itinerary_task(self, context, agent, destination_city, interests, date_from, date_to, callback=None):
         return Task(
             description=dedent(
                 f"""
@@ -247,13 +356,14 @@ class TripTasks:
                 """),
             context=context,  # Usa dados das tarefas anteriores
             agent=agent,
-            output_file='roteiro_viagem.md',
+            name='roteiro_viagem.md',
+            callback=callback,
         )
 
     # --------------------------------------------------
     # Tarefa 4: Criar guia de idioma e etiqueta local
     # --------------------------------------------------
-    def language_guide_task(self, context, agent, destination_city):
+    def language_guide_task(self, context, agent, destination_city, callback=None):
         return Task(
             description=dedent(
                 f"""
@@ -267,9 +377,7 @@ class TripTasks:
                 - Dicas de etiqueta local que o turista deve saber (gestos, hábitos, regras sociais).
 
                 Use linguagem clara e educativa.
-
-                Considere o seguinte roteiro de viagem:
-                '{context}'
+                Considere as atividades e os bairros do roteiro de viagem recebido como contexto.
                 """
             ),
             expected_output=dedent(
@@ -281,6 +389,8 @@ class TripTasks:
                 - Recomendações práticas para comunicação eficaz no destino.
                 """
             ),
+            context=context,  # Dependência explícita do roteiro (usada pelo agendador em DAG)
             agent=agent,
-            output_file='guia_comunicacao.md',
+            name='guia_comunicacao.md',
+            callback=callback,
         )
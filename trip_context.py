@@ -0,0 +1,115 @@
+# Importa módulos da biblioteca padrão usados na compactação do contexto entre tarefas.
+import os
+import re
+
+# Importa a estimativa de tokens usada pelo limitador de taxa e pelas métricas
+# (do módulo leve do limitador: compactar o contexto não carrega o CrewAI).
+from trip_ratelimit import estimate_tokens
+
+
+# Orçamento (em tokens estimados) do contexto entregue a cada tarefa; 0 desliga a compactação.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("TRIP_CONTEXT_TOKEN_BUDGET", 1500))
+
+# Separador usado pelo CrewAI ao concatenar as saídas das tarefas de contexto.
+CONTEXT_DIVIDER = "\n\n----------\n\n"
+
+# Termos que identificam cada tipo de informação nas linhas dos relatórios.
+FIELD_PATTERNS = {
+    "atividades": re.compile(
+        r"atra[çc]|museu|parque|passeio|visit|tour|praia|mercado|igreja|catedral|monumento|"
+        r"restaurante|gastronom|culin|prato|show|trilha|excurs|atividade|manh[ãa]|tarde|noite",
+        re.IGNORECASE,
+    ),
+    "bairros": re.compile(
+        r"bairro|regi[ãa]o|zona|distrito|centro|orla|perto|pr[óo]xim|localiza|hotel|hospedagem|pousada|hostel",
+        re.IGNORECASE,
+    ),
+    "custos": re.compile(
+        r"r\$|us\$|€|£|\$\s*\d|custo|pre[çc]o|gasto|tarifa|di[áa]ria|or[çc]amento|ingresso|gr[áa]tis|gratuit|"
+        r"\d\s*(reais|euros|d[óo]lares)",
+        re.IGNORECASE,
+    ),
+    "clima": re.compile(r"clima|temperatura|chuv|°|graus|previs[ãa]o", re.IGNORECASE),
+    "eventos": re.compile(r"evento|festival|feira|festa|exposi[çc]|concerto", re.IGNORECASE),
+    "transporte": re.compile(
+        r"metr[ôo]|[ôo]nibus|t[áa]xi|uber|trem|transporte|voo|aeroporto|desloc|carro|bicicleta|a p[ée]",
+        re.IGNORECASE,
+    ),
+}
+
+# Informações que cada tarefa precisa das saídas das suas dependências.
+# Tarefas fora desta tabela recebem o contexto completo.
+TASK_FIELDS = {
+    "roteiro_viagem.md": ("atividades", "bairros", "custos", "clima", "eventos", "transporte"),
+    "guia_comunicacao.md": ("atividades", "bairros", "transporte"),
+}
+
+HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+
+
+def context_tokens(text):
+    """Tokens estimados de um contexto (zero se não houver contexto)."""
+    return estimate_tokens(text) if text else 0
+
+
+def compact(text, fields, budget):
+    """Mantém as linhas do relatório ligadas a `fields`, dentro de `budget` tokens.
+
+    As linhas que citam mais campos entram primeiro; cada uma leva junto o título da
+    sua seção, e a ordem original é preservada. Texto que já cabe no orçamento é
+    devolvido inteiro.
+    """
+    text = (text or "").strip()
+    if context_tokens(text) <= budget:
+        return text
+
+    patterns = [FIELD_PATTERNS[name] for name in fields]
+    lines = [line.rstrip() for line in text.splitlines() if line.strip()]
+    section = []
+    candidates = []
+    current = None
+    for index, line in enumerate(lines):
+        if HEADING.match(line):
+            current = index
+            section.append(None)
+            continue
+        section.append(current)
+        score = sum(bool(pattern.search(line)) for pattern in patterns)
+        if score:
+            candidates.append((-score, index))
+
+    keep = set()
+    used = 0
+    for _, index in sorted(candidates):
+        heading = section[index]
+        cost = estimate_tokens(lines[index])
+        if heading is not None and heading not in keep:
+            cost += estimate_tokens(lines[heading])
+        if used + cost > budget:
+            continue
+        keep.add(index)
+        if heading is not None:
+            keep.add(heading)
+        used += cost
+    return "\n".join(lines[index] for index in sorted(keep))
+
+
+def compact_context(task, outputs, budget=CONTEXT_TOKEN_BUDGET):
+    """Contexto da tarefa `task` a partir das saídas das dependências, no formato do CrewAI.
+
+    O orçamento é dividido entre as dependências; o que uma saída curta não usa
+    fica para as demais.
+    """
+    fields = TASK_FIELDS.get(task)
+    if not fields or budget <= 0:
+        return CONTEXT_DIVIDER.join(outputs)
+
+    parts = [None] * len(outputs)
+    remaining = budget
+    # As saídas menores são distribuídas primeiro, liberando a sobra para as maiores.
+    order = sorted(range(len(outputs)), key=lambda i: len(outputs[i] or ""))
+    for position, index in enumerate(order):
+        share = remaining // (len(outputs) - position)
+        parts[index] = compact(outputs[index], fields, share)
+        remaining -= context_tokens(parts[index])
+    return CONTEXT_DIVIDER.join(part for part in parts if part)
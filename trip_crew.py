@@ -0,0 +1,222 @@
+# Importa as classes do CrewAI usadas no modo sequencial tradicional.
+from crewai import Crew, Process
+
+# Importa os agentes e tarefas do planejamento de viagem.
+from trip_components import TripAgents, TripTasks
+
+# Importa o agendador em DAG, que executa tarefas independentes em paralelo, o seu resultado
+# e o contexto compactado entregue a cada tarefa (usado também no modo sequencial).
+from trip_scheduler import DagScheduler, ScheduleResult, build_context, task_dependencies
+
+# Importa a medida do contexto entregue a cada tarefa.
+from trip_context import context_tokens
+
+# Importa a base de destinos, que guarda as partes genéricas do relatório da cidade.
+from trip_destinations import compose_city_report, extract_generic_sections, shared_destination_store
+
+# Importa os eventos de início e fim de tarefa publicados no barramento.
+from trip_events import AgentStarted, TaskCompleted, emit, end_task, start_task
+
+# Importa a prioridade usada pelo limitador de taxa (viagens perto do fim passam na frente).
+from trip_ratelimit import set_priority
+
+# Importa a instrumentação (span da execução completa e de cada tarefa).
+from trip_tracing import span, start_span
+
+import time
+
+
+# Modos de execução suportados pelo TripCrew.
+SEQUENTIAL = "sequential"
+DAG = "dag"
+
+
+# ======================================================
+# CLASSE: CompactContextCrew
+# Crew sequencial do CrewAI que entrega a cada tarefa o mesmo contexto
+# compactado do modo DAG, em vez das saídas completas das dependências.
+# ======================================================
+class CompactContextCrew(Crew):
+    def _get_context(self, task, task_outputs):
+        if task_dependencies(task):
+            return build_context(task)
+        return super()._get_context(task, task_outputs)
+
+
+# ======================================================
+# CLASSE: TripCrew
+# Monta os agentes e tarefas de uma viagem e executa o planejamento.
+# ======================================================
+class TripCrew:
+    def __init__(self, from_city, destination_city, date_from, date_to, interests, mode=DAG, on_task_done=None,
+                 llm=None):
+        self.from_city = from_city
+        self.destination_city = destination_city
+        self.date_from = date_from
+        self.date_to = date_to
+        self.interests = interests
+        self.mode = mode
+        self.destinations = shared_destination_store()
+        self.known_sections = None
+        # `on_task_done(name, markdown)` é chamado assim que cada relatório fica pronto.
+        self.on_task_done = on_task_done
+        # LLM usado por todos os agentes (None = OpenAI, com cache semântico conforme a tarefa).
+        self.llm = llm
+
+    def task_callback(self, name):
+        """Cria o callback do CrewAI que completa o relatório e o repassa para `on_task_done`."""
+        compose = name == "relatorio_local.md" and bool(self.known_sections)
+        if self.on_task_done is None and not compose:
+            return None
+
+        def callback(output):
+            if compose:
+                # O relatório completo substitui a parte específica na própria saída da tarefa:
+                # é ela que o roteiro e o guia recebem como contexto.
+                output.raw = compose_city_report(self.known_sections, output.raw)
+            if self.on_task_done is not None:
+                self.on_task_done(name, output.raw)
+
+        return callback
+
+    def build(self):
+        """Cria agentes e tarefas. Retorna (agentes, tarefas) na ordem do relatório."""
+        agents = TripAgents(llm=self.llm, trip={
+            "from_city": self.from_city, "destination_city": self.destination_city,
+            "date_from": self.date_from, "date_to": self.date_to, "interests": self.interests,
+        })
+        tasks = TripTasks()
+
+        city_info_agent = agents.city_info_agent()
+        logistics_expert_agent = agents.logistics_expert_agent()
+        itinerary_planner_agent = agents.itinerary_planner_agent()
+        language_guide_agent = agents.language_guide_agent()
+
+        # Seções genéricas já conhecidas do destino (None se a cidade é nova ou está desatualizada).
+        self.known_sections = self.destinations.fresh_sections(self.destination_city)
+        city_info = tasks.city_info_task(
+            city_info_agent, self.from_city, self.destination_city,
+            self.interests, self.date_from, self.date_to,
+            known_sections=self.known_sections,
+            callback=self.task_callback("relatorio_local.md")
+        )
+
+        # A logística só precisa de destino e datas: no modo DAG ela roda junto com city_info.
+        plan_logistics = tasks.plan_logistics_task(
+            [] if self.mode == DAG else [city_info], logistics_expert_agent,
+            self.destination_city, self.interests, self.date_from, self.date_to,
+            callback=self.task_callback("relatorio_logistica.md")
+        )
+
+        build_itinerary = tasks.build_itinerary_task(
+            [city_info, plan_logistics],
+            itinerary_planner_agent, self.destination_city,
+            self.interests, self.date_from, self.date_to,
+            callback=self.task_callback("roteiro_viagem.md")
+        )
+
+        language_guide = tasks.language_guide_task(
+            [build_itinerary], language_guide_agent, self.destination_city,
+            callback=self.task_callback("guia_comunicacao.md")
+        )
+
+        agent_list = [city_info_agent, logistics_expert_agent, itinerary_planner_agent, language_guide_agent]
+        task_list = [city_info, plan_logistics, build_itinerary, language_guide]
+        return agent_list, task_list
+
+    def run(self):
+        """Executa o planejamento. Nos dois modos retorna um ScheduleResult (saídas, tempos e caminho crítico)."""
+        with span("trip.run", **{
+            "trip.destination": self.destination_city, "trip.mode": self.mode,
+            "trip.date_from": self.date_from, "trip.date_to": self.date_to,
+        }) as active:
+            agent_list, task_list = self.build()
+            active.set_attribute("trip.known_destination", bool(self.known_sections))
+
+            if self.mode == DAG:
+                # Executa seguindo as arestas de `context=` e reporta o caminho crítico.
+                result = DagScheduler(task_list).run()
+            else:
+                result = ScheduleResult()
+                started = time.perf_counter()
+                crew = CompactContextCrew(
+                    agents=agent_list,
+                    tasks=task_list,
+                    process=Process.sequential,
+                    full_output=True,
+                    verbose=True,
+                    task_callback=self.sequential_events(task_list, result)
+                )
+                crew.kickoff()
+                result.wall_time = time.perf_counter() - started
+                # Cada tarefa espera a anterior: o caminho crítico é a sequência inteira.
+                result.critical_path = list(result.timings)
+
+            # O resumo vai para o span (e para o resultado do trabalho), não para o stdout do worker.
+            active.set_attribute("trip.critical_path", " → ".join(result.critical_path))
+            active.set_attribute("trip.summary", result.summary())
+            self.update_destination(task_list[0])
+            return result
+
+    @staticmethod
+    def sequential_events(task_list, result):
+        """No modo sequencial, publica início e fim de cada tarefa a partir do `task_callback` da Crew.
+
+        Saídas e tempos de cada tarefa são registrados em `result` (ScheduleResult).
+        """
+        origin = time.perf_counter()
+        state = {"index": 0, "started": origin, "span": None}
+
+        def announce():
+            task = task_list[state["index"]]
+            agent_role = task.agent.role if task.agent else ""
+            state["started"] = time.perf_counter()
+            # Como no modo DAG: prioridade no limitador = número de tarefas já concluídas.
+            set_priority(state["index"])
+            state["span"] = start_span("trip.task", **{"task.name": task.name, "task.agent": agent_role})
+            # As chamadas ao modelo até o próximo callback pertencem a esta tarefa.
+            state["task"] = start_task(task.name)
+            emit(AgentStarted, agent=agent_role, task=task.name)
+
+        def callback(output):
+            task = task_list[state["index"]]
+            state["span"].set_attribute("task.output_chars", len(output.raw or ""))
+            state["span"].end()
+            end_task(state["task"])
+            finished = time.perf_counter()
+            result.outputs[task.name] = output
+            result.timings[task.name] = (state["started"] - origin, finished - origin)
+            emit(
+                TaskCompleted, task=task.name, agent=output.agent or "",
+                duration=finished - state["started"], output_chars=len(output.raw or ""),
+                context_tokens=context_tokens(build_context(task)) if task_dependencies(task) else 0,
+            )
+            state["index"] += 1
+            if state["index"] < len(task_list):
+                announce()
+
+        announce()
+        return callback
+
+    def update_destination(self, city_info):
+        """Atualiza a base de destinos com as seções genéricas do relatório da cidade."""
+        if city_info.output is None:
+            return
+        # Com seções já conhecidas, o relatório completo é montado no `task_callback`.
+        if not self.known_sections:
+            sections = extract_generic_sections(city_info.output.raw)
+            if sections:
+                self.destinations.update(self.destination_city, sections)
+        # Aproveita para atualizar, em segundo plano, algum destino desatualizado. Com um LLM
+        # injetado (benchmark, execuções offline) não há atualização: ela usaria o modelo e as
+        # buscas reais.
+        if self.llm is None:
+            self.destinations.refresh_stale_async(refresh_destination)
+
+
+def refresh_destination(city):
+    """Gera novamente as seções genéricas de um destino (usado na atualização em segundo plano)."""
+    agents = TripAgents()
+    agent = agents.city_info_agent()
+    task = TripTasks().destination_profile_task(agent, city)
+    return Crew(agents=[agent], tasks=[task], process=Process.sequential).kickoff().raw
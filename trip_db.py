@@ -0,0 +1,332 @@
+# Importa módulos da biblioteca padrão usados pelo acesso ao banco de usuários e viagens.
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+
+
+# Banco SQLite dos usuários do app. Na primeira execução é criado a partir da cópia
+# versionada (contas iniciais), que nunca é aberta para escrita.
+USERS_DB_PATH = os.getenv("TRIP_USERS_DB", "users.db")
+USERS_DB_SEED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "users.seed.db")
+
+# Custo do PBKDF2 (mantido em 200 mil iterações: os hashes já gravados continuam válidos).
+PBKDF2_ITERATIONS = 200000
+
+# Verificações de senha simultâneas (cada uma ocupa um núcleo por ~0,1-0,3s) e
+# quantas podem aguardar na fila antes de o login ser recusado.
+AUTH_WORKERS = int(os.getenv("TRIP_AUTH_WORKERS", 2))
+AUTH_MAX_PENDING = int(os.getenv("TRIP_AUTH_MAX_PENDING", 8))
+AUTH_TIMEOUT = 10
+
+# Tentativas de login com falha permitidas por usuário dentro da janela (em segundos).
+LOGIN_MAX_FAILURES = int(os.getenv("TRIP_LOGIN_MAX_FAILURES", 5))
+LOGIN_WINDOW = int(os.getenv("TRIP_LOGIN_WINDOW", 300))
+LOGIN_MAX_TRACKED = 10000
+
+# Colunas retornadas nas listagens do histórico (sem o conteúdo dos relatórios).
+TRIP_SUMMARY_COLUMNS = "t.id, t.run_id, t.from_city, t.destination, t.date_from, t.date_to, t.interests, t.created_at"
+
+
+# ======================================================
+# SENHAS
+# ======================================================
+def hash_password(password: str, salt: bytes = None):
+    if salt is None:
+        salt = os.urandom(16)
+    dk = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+    return binascii.hexlify(dk).decode(), binascii.hexlify(salt).decode()
+
+
+def verify_password(stored_hash_hex, stored_salt_hex, password_attempt):
+    salt = binascii.unhexlify(stored_salt_hex)
+    attempt_hash_hex, _ = hash_password(password_attempt, salt)
+    return hmac.compare_digest(attempt_hash_hex, stored_hash_hex)
+
+
+def seed_database(path, seed=USERS_DB_SEED):
+    """Copia o banco inicial para `path` se ele ainda não existir (cópia atômica entre processos)."""
+    if os.path.exists(path) or not os.path.exists(seed):
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    shutil.copyfile(seed, tmp)
+    try:
+        os.link(tmp, path)  # falha se outro processo já criou o banco
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+
+
+# ======================================================
+# CLASSE: LoginThrottle
+# Conta as falhas recentes de cada usuário e bloqueia novas tentativas
+# (sem calcular o hash) até a janela expirar.
+# ======================================================
+class LoginThrottle:
+    def __init__(self, max_failures=LOGIN_MAX_FAILURES, window=LOGIN_WINDOW):
+        self.max_failures = max_failures
+        self.window = window
+        self._lock = threading.Lock()
+        self._failures = defaultdict(deque)
+
+    def _prune(self, username, now):
+        failures = self._failures[username]
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[username]
+        return failures
+
+    def retry_after(self, username):
+        """Segundos até o usuário poder tentar de novo (0 se a tentativa for permitida)."""
+        now = time.time()
+        with self._lock:
+            failures = self._prune(username, now)
+            if len(failures) < self.max_failures:
+                return 0
+            return int(failures[0] + self.window - now) + 1
+
+    def record(self, username, ok):
+        with self._lock:
+            if ok:
+                self._failures.pop(username, None)
+            else:
+                now = time.time()
+                self._failures[username].append(now)
+                # Nomes tentados uma única vez não ficam na memória além da janela.
+                if len(self._failures) > LOGIN_MAX_TRACKED:
+                    for name in list(self._failures):
+                        self._prune(name, now)
+
+
+def fts_query(text):
+    """Converte o texto digitado em uma consulta FTS5 segura (todos os termos, por prefixo)."""
+    terms = re.findall(r"\w+", text or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+# ======================================================
+# CLASSE: UserDB
+# Camada de acesso ao users.db: uma única conexão (modo WAL) por processo,
+# compartilhada entre as sessões do Streamlit, com o esquema criado uma vez.
+# As consultas usam SQL constante e parâmetros, reaproveitando as instruções
+# já preparadas pelo cache de statements do sqlite3.
+# Guarda também o histórico de viagens de cada usuário, com índice FTS5 sobre
+# destino, interesses e conteúdo dos relatórios.
+# ======================================================
+class UserDB:
+    SQL_USER = "SELECT password_hash, salt, role FROM users WHERE username=?"
+    SQL_INSERT_USER = "INSERT INTO users (username, password_hash, salt, role, created_at) VALUES (?, ?, ?, ?, ?)"
+
+    def __init__(self, path=None, auth_workers=AUTH_WORKERS, auth_max_pending=AUTH_MAX_PENDING):
+        self.path = path or USERS_DB_PATH
+        seed_database(self.path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, timeout=30, isolation_level=None, cached_statements=64
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_schema()
+
+        # Pool limitado para o PBKDF2: uma rajada de logins não disputa a CPU das crews.
+        self._auth_pool = ThreadPoolExecutor(max_workers=auth_workers, thread_name_prefix="trip-auth")
+        self._auth_slots = threading.BoundedSemaphore(auth_max_pending)
+        self.throttle = LoginThrottle()
+
+    def _create_schema(self):
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                salt TEXT NOT NULL,
+                role TEXT NOT NULL DEFAULT 'user',
+                created_at TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trips (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                run_id TEXT UNIQUE,
+                from_city TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                date_from TEXT,
+                date_to TEXT,
+                interests TEXT NOT NULL,
+                reports TEXT NOT NULL,
+                timings TEXT,
+                from_cache INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trips_user ON trips (user_id, created_at)")
+        # Índice de texto (rowid = trips.id); acentos ignorados: "sao paulo" encontra "São Paulo".
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS trips_fts USING fts5(
+                destination, interests, content, tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        # cria admin padrão
+        if self._fetchone("SELECT id FROM users WHERE username=?", ('admin',)) is None:
+            try:
+                self.create_user('admin', 'admin123', role='admin')
+            except sqlite3.IntegrityError:
+                pass  # criado por outro processo ao mesmo tempo
+
+    # As linhas são lidas ainda com o lock: a conexão é compartilhada entre as
+    # threads e um cursor consumido fora dele disputaria o mesmo statement.
+    def _execute(self, sql, args=()):
+        with self._lock:
+            self._conn.execute(sql, args)
+
+    def _fetchone(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchone()
+
+    def _fetchall(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    # --------------------------------------------------
+    # Usuários
+    # --------------------------------------------------
+    def create_user(self, username, password, role='user'):
+        pwd_hash, salt = hash_password(password)
+        self._execute(self.SQL_INSERT_USER, (username, pwd_hash, salt, role, datetime.utcnow().isoformat()))
+
+    def get_user(self, username):
+        """(password_hash, salt, role) do usuário, ou None."""
+        return self._fetchone(self.SQL_USER, (username,))
+
+    def authenticate(self, username, password):
+        """Retorna (ok, mensagem, papel). O hash roda no pool limitado, fora da thread do script."""
+        wait = self.throttle.retry_after(username)
+        if wait:
+            return False, f"Muitas tentativas. Tente novamente em {wait}s", None
+
+        row = self.get_user(username)
+        if not row:
+            self.throttle.record(username, False)
+            return False, "Usuário não encontrado", None
+        stored_hash, stored_salt, role = row
+
+        if not self._auth_slots.acquire(blocking=False):
+            return False, "Muitos acessos no momento. Tente novamente em instantes", None
+        try:
+            future = self._auth_pool.submit(verify_password, stored_hash, stored_salt, password)
+            future.add_done_callback(lambda f: self._auth_slots.release())
+        except Exception:
+            self._auth_slots.release()
+            raise
+        try:
+            ok = future.result(timeout=AUTH_TIMEOUT)
+        except FutureTimeout:
+            return False, "Muitos acessos no momento. Tente novamente em instantes", None
+
+        self.throttle.record(username, ok)
+        if ok:
+            return True, "Autenticado", role
+        else:
+            return False, "Senha incorreta", None
+
+    # --------------------------------------------------
+    # Histórico de viagens
+    # --------------------------------------------------
+    def save_trip(self, username, run_id, params, reports, timings=None, from_cache=False):
+        """Grava (ou substitui, para o mesmo run_id) a viagem no histórico do usuário.
+
+        `reports` é {arquivo .md: conteúdo}. Retorna o id da viagem, ou None se o usuário não existir.
+        """
+        content = "\n\n".join(reports.values())
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                user = self._conn.execute("SELECT id FROM users WHERE username=?", (username,)).fetchone()
+                if user is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                old = self._conn.execute("SELECT id FROM trips WHERE run_id=?", (run_id,)).fetchone()
+                if old is not None:
+                    self._conn.execute("DELETE FROM trips_fts WHERE rowid=?", (old["id"],))
+                    self._conn.execute("DELETE FROM trips WHERE id=?", (old["id"],))
+                trip_id = self._conn.execute(
+                    "INSERT INTO trips (user_id, run_id, from_city, destination, date_from, date_to, interests, "
+                    "reports, timings, from_cache, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        user["id"], run_id, params["from_city"], params["destination_city"],
+                        params.get("date_from"), params.get("date_to"), params["interests"],
+                        json.dumps(reports, ensure_ascii=False), json.dumps(timings or {}, default=str),
+                        int(bool(from_cache)), time.time(),
+                    ),
+                ).lastrowid
+                self._conn.execute(
+                    "INSERT INTO trips_fts (rowid, destination, interests, content) VALUES (?, ?, ?, ?)",
+                    (trip_id, params["destination_city"], params["interests"], content),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return trip_id
+
+    def recent_trips(self, username, limit=20):
+        rows = self._fetchall(
+            f"SELECT {TRIP_SUMMARY_COLUMNS}, '' AS snippet FROM trips t JOIN users u ON u.id = t.user_id "
+            "WHERE u.username=? ORDER BY t.created_at DESC LIMIT ?",
+            (username, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def search_trips(self, username, text, limit=20):
+        """Viagens do usuário que casam com `text`, das mais relevantes para as menos (vazio = recentes)."""
+        query = fts_query(text)
+        if not query:
+            return self.recent_trips(username, limit)
+        # Pesos do bm25: o destino vale mais que os interesses, que valem mais que o conteúdo.
+        rows = self._fetchall(
+            f"SELECT {TRIP_SUMMARY_COLUMNS}, snippet(trips_fts, 2, '**', '**', '…', 16) AS snippet "
+            "FROM trips_fts JOIN trips t ON t.id = trips_fts.rowid JOIN users u ON u.id = t.user_id "
+            "WHERE trips_fts MATCH ? AND u.username=? ORDER BY bm25(trips_fts, 10.0, 3.0, 1.0) LIMIT ?",
+            (query, username, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def get_trip(self, username, trip_id):
+        """Viagem completa (com relatórios e tempos), se pertencer ao usuário."""
+        row = self._fetchone(
+            f"SELECT {TRIP_SUMMARY_COLUMNS}, t.reports, t.timings, t.from_cache FROM trips t "
+            "JOIN users u ON u.id = t.user_id WHERE t.id=? AND u.username=?",
+            (trip_id, username),
+        )
+        if row is None:
+            return None
+        trip = dict(row)
+        trip["reports"] = json.loads(trip["reports"])
+        trip["timings"] = json.loads(trip["timings"]) if trip["timings"] else {}
+        return trip
+
+
+# Instância única por processo para quem não usa o cache do Streamlit (workers da fila, ferramentas).
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_user_db(path=None):
+    path = path or USERS_DB_PATH
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = UserDB(path)
+        return _shared[path]
@@ -0,0 +1,184 @@
+# Importa módulos da biblioteca padrão usados pela base de destinos.
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Reaproveita a normalização usada pelos caches (sem acentos, minúsculas).
+from trip_cache import normalize_query
+
+# Importa a instrumentação (um span por destino atualizado em segundo plano).
+from trip_tracing import span
+
+
+# Caminho do banco SQLite da base de destinos (pode ser alterado via variável de ambiente).
+DESTINATIONS_DB_PATH = os.getenv("TRIP_DESTINATIONS_DB", "destinations.db")
+
+# Idade máxima (em segundos) para uma seção ser considerada atual (padrão: 30 dias).
+DESTINATION_MAX_AGE = int(os.getenv("TRIP_DESTINATION_MAX_AGE", 30 * 24 * 3600))
+
+# Seções do relatório da cidade que não dependem do cliente, com o padrão que
+# identifica cada uma nos títulos do markdown gerado pelo agente. As palavras
+# precisam aparecer inteiras (aceitando o plural); as do resumo, que também
+# aparecem em títulos específicos ("Eventos culturais", "Dicas sobre passeios"),
+# só valem no início do título.
+GENERIC_SECTIONS = {
+    "resumo": re.compile(r"^(resumo|sobre|visao geral|cultura)\b"),
+    "custos": re.compile(r"\b(despesa|custo|gasto|orcamento)s?\b"),
+    "seguranca": re.compile(r"\bseguranca\b"),
+    "costumes": re.compile(r"\b(costume|etiqueta)s?\b"),
+}
+
+
+# ======================================================
+# FUNÇÕES AUXILIARES DE MARKDOWN
+# ======================================================
+def split_sections(markdown):
+    """Divide o markdown em blocos (título, texto completo do bloco) a cada cabeçalho."""
+    sections = []
+    current_title, current_lines = None, []
+    for line in (markdown or "").splitlines():
+        match = re.match(r"^#{1,3}\s+(.*)", line)
+        if match:
+            if current_title is not None or any(l.strip() for l in current_lines):
+                sections.append((current_title, "\n".join(current_lines).strip()))
+            current_title, current_lines = match.group(1).strip(), [line]
+        else:
+            current_lines.append(line)
+    if current_title is not None or any(l.strip() for l in current_lines):
+        sections.append((current_title, "\n".join(current_lines).strip()))
+    return sections
+
+
+def heading_text(title):
+    """Título normalizado sem numeração, emojis e marcação ("1. 📝 **Resumo**" → "resumo")."""
+    return re.sub(r"^[^a-z]+", "", normalize_query(title).replace("*", "").replace("_", " "))
+
+
+def extract_generic_sections(markdown):
+    """Extrai do relatório da cidade as seções genéricas (resumo, custos, segurança, costumes)."""
+    found = {}
+    for title, block in split_sections(markdown):
+        if not title:
+            continue
+        normalized = heading_text(title)
+        for section, pattern in GENERIC_SECTIONS.items():
+            if section not in found and pattern.search(normalized):
+                found[section] = block
+                break
+    return found
+
+
+def compose_city_report(known_sections, specific_markdown):
+    """Monta o relatório final: seções genéricas da base + parte específica gerada pelo agente."""
+    generic = [known_sections[name] for name in ("resumo",) if name in known_sections]
+    tail = [known_sections[name] for name in ("custos", "seguranca", "costumes") if name in known_sections]
+    return "\n\n".join(generic + [specific_markdown.strip()] + tail) + "\n"
+
+
+# ======================================================
+# CLASSE: DestinationStore
+# Base local com as seções genéricas de cada destino e a data da última atualização.
+# ======================================================
+class DestinationStore:
+    def __init__(self, path=None, max_age=DESTINATION_MAX_AGE):
+        self.path = path or DESTINATIONS_DB_PATH
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS destination_sections (
+                city_key TEXT NOT NULL,
+                city TEXT NOT NULL,
+                section TEXT NOT NULL,
+                content TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (city_key, section)
+            )
+        """)
+        self._conn.commit()
+
+    def fresh_sections(self, city):
+        """Seções atuais do destino. Retorna None se faltar alguma (o agente gera tudo)."""
+        limit = time.time() - self.max_age
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT section, content FROM destination_sections WHERE city_key=? AND updated_at >= ?",
+                (normalize_query(city), limit),
+            ).fetchall()
+        sections = dict(rows)
+        return sections if set(GENERIC_SECTIONS) <= set(sections) else None
+
+    def update(self, city, sections):
+        """Grava (ou substitui) as seções informadas, marcando o horário da atualização."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO destination_sections VALUES (?, ?, ?, ?, ?)",
+                [(normalize_query(city), city, name, content, now) for name, content in sections.items()],
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM destination_sections")
+            self._conn.commit()
+
+    def stale_cities(self):
+        """Destinos com alguma seção mais antiga que `max_age`."""
+        with self._lock:
+            return self._stale_cities()
+
+    def _stale_cities(self):
+        # Deve ser chamada com o lock já adquirido.
+        limit = time.time() - self.max_age
+        rows = self._conn.execute(
+            "SELECT city FROM destination_sections GROUP BY city_key HAVING MIN(updated_at) < ?",
+            (limit,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def refresh_stale_async(self, refresher, limit=1):
+        """Atualiza em segundo plano até `limit` destinos desatualizados.
+
+        `refresher(city)` deve retornar o markdown com as seções genéricas do destino.
+        A thread roda em uma cópia do contexto de quem chamou (execução, usuário e trace).
+        """
+        with self._lock:
+            cities = [city for city in self._stale_cities() if city not in self._refreshing][:limit]
+            self._refreshing.update(cities)
+
+        def worker():
+            for city in cities:
+                try:
+                    with span("destination.refresh", **{"trip.destination": city}):
+                        sections = extract_generic_sections(refresher(city))
+                    if sections:
+                        self.update(city, sections)
+                except Exception as e:
+                    print(f"Erro ao atualizar destino {city}: {e}")
+                finally:
+                    with self._lock:
+                        self._refreshing.discard(city)
+
+        if cities:
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(worker,), name="trip-destination-refresh", daemon=True).start()
+        return cities
+
+
+# Instância única por processo: todas as viagens do worker compartilham a conexão
+# e o conjunto `_refreshing`, para um destino não ser atualizado duas vezes ao mesmo tempo.
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_destination_store(path=None):
+    path = path or DESTINATIONS_DB_PATH
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = DestinationStore(path)
+        return _shared[path]
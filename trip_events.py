@@ -0,0 +1,372 @@
+# Importa módulos da biblioteca padrão usados pelo barramento de eventos.
+import contextvars
+import functools
+import inspect
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Importa a instrumentação (spans do OpenTelemetry, no-op se indisponível).
+from trip_tracing import span
+
+
+# ======================================================
+# EVENTOS
+# Cada execução (run) publica eventos tipados em vez de imprimir no terminal:
+# a interface, os logs e as métricas assinam apenas os eventos da sua execução.
+# ======================================================
+@dataclass(frozen=True, kw_only=True)
+class TripEvent:
+    run_id: str
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass(frozen=True, kw_only=True)
+class AgentStarted(TripEvent):
+    agent: str
+    task: str
+
+
+@dataclass(frozen=True, kw_only=True)
+class AgentStep(TripEvent):
+    agent: str
+    # Ferramenta escolhida pelo agente neste passo (None quando é a resposta final).
+    tool: str = None
+    thought: str = ""
+
+
+@dataclass(frozen=True, kw_only=True)
+class ToolCalled(TripEvent):
+    tool: str
+    args: dict
+    duration: float
+    error: str = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class LLMCalled(TripEvent):
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    duration: float
+    cached: bool = False
+    # Tokens estimados pelo tamanho do texto (o provedor não informou o consumo, ou foi um acerto do cache).
+    estimated: bool = False
+    # Tarefa em execução quando o modelo foi chamado (preenchida a partir da ContextVar).
+    task: str = field(default_factory=lambda: current_task() or "")
+
+
+@dataclass(frozen=True, kw_only=True)
+class CacheLooked(TripEvent):
+    # Namespace consultado ("search:tavily", "llm:city_info"...) e se a entrada foi encontrada.
+    cache: str
+    hit: bool
+
+
+@dataclass(frozen=True, kw_only=True)
+class RateLimitWaited(TripEvent):
+    # Limitador ("openai", "tavily"), espera na fila e prioridade usada na chamada.
+    limiter: str
+    wait: float
+    priority: int = 0
+
+
+@dataclass(frozen=True, kw_only=True)
+class TaskCompleted(TripEvent):
+    task: str
+    agent: str
+    duration: float
+    output_chars: int = 0
+    # Tokens estimados do contexto (saídas das dependências) entregue à tarefa.
+    context_tokens: int = 0
+
+
+# ======================================================
+# EXECUÇÃO ATUAL
+# O identificador da execução viaja em uma ContextVar: threads criadas com
+# `contextvars.copy_context().run` publicam na execução que as originou.
+# ======================================================
+_current_run = contextvars.ContextVar("trip_run", default=None)
+_current_user = contextvars.ContextVar("trip_user", default=None)
+_current_task = contextvars.ContextVar("trip_task", default=None)
+
+
+def current_run():
+    return _current_run.get()
+
+
+def current_user():
+    """Usuário dono da execução atual (ex: para ferramentas que consultam o histórico dele)."""
+    return _current_user.get()
+
+
+def current_task():
+    """Nome da tarefa em execução nesta thread (usado na contagem de tokens por tarefa)."""
+    return _current_task.get()
+
+
+def start_task(name):
+    """Marca `name` como a tarefa atual. Retorna o token para `end_task`."""
+    return _current_task.set(name)
+
+
+def end_task(token):
+    _current_task.reset(token)
+
+
+@contextmanager
+def task_context(name):
+    token = start_task(name)
+    try:
+        yield name
+    finally:
+        end_task(token)
+
+
+# Sinal de interrupção das tarefas de uma execução: o agendador liga o evento quando
+# uma tarefa falha, e as demais param na próxima chamada ao modelo.
+_cancel_event = contextvars.ContextVar("trip_cancel", default=None)
+
+
+class TaskCancelled(Exception):
+    """A tarefa foi interrompida porque outra tarefa da mesma execução falhou."""
+
+
+def watch_cancel(event):
+    """Associa `event` (threading.Event) às tarefas que rodam neste contexto."""
+    _cancel_event.set(event)
+
+
+def raise_if_cancelled():
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise TaskCancelled(f"Tarefa {current_task() or ''} interrompida: outra tarefa da execução falhou")
+
+
+@contextmanager
+def run_context(run_id=None, username=None):
+    """Define a execução atual (e seu usuário) dentro do bloco `with`. Retorna o identificador usado."""
+    run_id = run_id or uuid.uuid4().hex[:12]
+    token = _current_run.set(run_id)
+    user_token = _current_user.set(username)
+    try:
+        yield run_id
+    finally:
+        _current_user.reset(user_token)
+        _current_run.reset(token)
+
+
+# ======================================================
+# CLASSE: EventBus
+# Entrega cada evento aos assinantes da execução correspondente e aos
+# assinantes globais (run_id=None). Erros de um assinante não afetam os demais.
+# ======================================================
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+
+    def subscribe(self, run_id, handler):
+        """Registra `handler(event)` para a execução (ou todas, com None). Retorna a função que cancela."""
+        with self._lock:
+            self._subscribers[run_id].append(handler)
+
+        def unsubscribe():
+            with self._lock:
+                handlers = self._subscribers.get(run_id, [])
+                if handler in handlers:
+                    handlers.remove(handler)
+                if not handlers:
+                    self._subscribers.pop(run_id, None)
+
+        return unsubscribe
+
+    @contextmanager
+    def subscribed(self, run_id, handler):
+        unsubscribe = self.subscribe(run_id, handler)
+        try:
+            yield handler
+        finally:
+            unsubscribe()
+
+    def publish(self, event):
+        with self._lock:
+            handlers = self._subscribers.get(event.run_id, []) + self._subscribers.get(None, [])
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception:
+                traceback.print_exc()
+
+
+# Barramento único por processo.
+bus = EventBus()
+
+
+def emit(event_type, **fields):
+    """Publica um evento na execução atual (não faz nada fora de uma execução)."""
+    run_id = _current_run.get()
+    if run_id is None:
+        return None
+    event = event_type(run_id=run_id, **fields)
+    bus.publish(event)
+    return event
+
+
+# ======================================================
+# INTEGRAÇÕES COM O CREWAI
+# ======================================================
+def agent_step_callback(agent):
+    """`step_callback` do CrewAI que publica cada passo (pensamento/ferramenta) do agente `agent` (papel)."""
+
+    def callback(step):
+        emit(
+            AgentStep,
+            agent=agent,
+            tool=getattr(step, "tool", None),
+            thought=(getattr(step, "thought", "") or "").strip(),
+        )
+
+    return callback
+
+
+def observe_steps(agent):
+    """Liga os passos do agente ao barramento, identificados pelo papel (o mesmo usado em AgentStarted)."""
+    agent.step_callback = agent_step_callback(agent.role)
+    return agent
+
+
+def tool_events(name):
+    """Decorador das funções de ferramenta: publica ToolCalled com argumentos e duração
+    e registra a chamada em um span `tool.<nome>`.
+
+    Deve ficar abaixo do `@tool` do CrewAI (preserva assinatura, anotações e docstring).
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                call_args = dict(signature.bind_partial(*args, **kwargs).arguments)
+            except TypeError:
+                call_args = {"args": args, **kwargs}
+            started = time.perf_counter()
+            error = None
+            with span(f"tool.{name}", **{f"tool.arg.{key}": value for key, value in call_args.items()}) as active:
+                try:
+                    result = func(*args, **kwargs)
+                    active.set_attribute("tool.result_chars", len(str(result)))
+                    return result
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    active.record_exception(e)
+                    raise
+                finally:
+                    emit(ToolCalled, tool=name, args=call_args, duration=time.perf_counter() - started, error=error)
+
+        return wrapper
+
+    return decorator
+
+
+# ======================================================
+# ASSINANTES PRONTOS
+# ======================================================
+def describe(event):
+    """Texto curto do evento, usado como progresso na interface e nos logs."""
+    if isinstance(event, AgentStarted):
+        return f"{event.agent}: iniciando {event.task}"
+    if isinstance(event, AgentStep) and event.tool:
+        return f"{event.agent}: usando {event.tool}"
+    if isinstance(event, ToolCalled):
+        status = "falhou" if event.error else f"{event.duration:.1f}s"
+        return f"{event.tool} ({status})"
+    if isinstance(event, TaskCompleted):
+        return f"{event.task} pronto ({event.duration:.0f}s)"
+    return None
+
+
+# Espera mínima (em segundos) para uma chamada contar como segurada pelo limitador.
+THROTTLED_WAIT = 0.05
+
+
+class RunMetrics:
+    """Assinante que agrega as métricas de uma execução (chamadas, tokens e tempos)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tool_calls = Counter()
+        self.tool_errors = 0
+        self.tool_time = 0.0
+        self.llm_calls = 0
+        self.llm_cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # Chamadas cujos tokens são estimativas (os totais acima somam consumo real e estimado).
+        self.estimated_llm_calls = 0
+        self.task_durations = {}
+        # Acertos e faltas de cada cache (buscas e cache semântico do LLM) nesta execução.
+        self.cache = defaultdict(lambda: {"hits": 0, "misses": 0})
+        # Espera na fila de cada limitador de taxa (chamadas, chamadas que esperaram e tempo).
+        self.rate_limits = defaultdict(lambda: {"calls": 0, "throttled": 0, "total_wait": 0.0, "max_wait": 0.0})
+        # Tokens enviados (prompt e contexto) e recebidos por tarefa.
+        self.task_tokens = defaultdict(lambda: {"llm_calls": 0, "estimated_llm_calls": 0, "prompt_tokens": 0,
+                                                "completion_tokens": 0, "context_tokens": 0})
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event, ToolCalled):
+                self.tool_calls[event.tool] += 1
+                self.tool_time += event.duration
+                self.tool_errors += bool(event.error)
+            elif isinstance(event, LLMCalled):
+                self.llm_calls += 1
+                self.llm_cache_hits += event.cached
+                self.prompt_tokens += event.prompt_tokens
+                self.completion_tokens += event.completion_tokens
+                self.estimated_llm_calls += event.estimated
+                usage = self.task_tokens[event.task or "-"]
+                usage["llm_calls"] += 1
+                usage["estimated_llm_calls"] += event.estimated
+                usage["prompt_tokens"] += event.prompt_tokens
+                usage["completion_tokens"] += event.completion_tokens
+            elif isinstance(event, CacheLooked):
+                self.cache[event.cache]["hits" if event.hit else "misses"] += 1
+            elif isinstance(event, RateLimitWaited):
+                limits = self.rate_limits[event.limiter]
+                limits["calls"] += 1
+                limits["throttled"] += event.wait >= THROTTLED_WAIT
+                limits["total_wait"] += event.wait
+                limits["max_wait"] = max(limits["max_wait"], event.wait)
+            elif isinstance(event, TaskCompleted):
+                self.task_durations[event.task] = round(event.duration, 2)
+                self.task_tokens[event.task]["context_tokens"] = event.context_tokens
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "tool_calls": dict(self.tool_calls),
+                "tool_errors": self.tool_errors,
+                "tool_time": round(self.tool_time, 2),
+                "llm_calls": self.llm_calls,
+                "llm_cache_hits": self.llm_cache_hits,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "estimated_llm_calls": self.estimated_llm_calls,
+                "task_durations": dict(self.task_durations),
+                "cache": {
+                    name: {**counts, "hit_rate": round(counts["hits"] / (counts["hits"] + counts["misses"]), 3)}
+                    for name, counts in self.cache.items()
+                },
+                "rate_limits": {
+                    name: {**limits, "total_wait": round(limits["total_wait"], 3), "max_wait": round(limits["max_wait"], 3)}
+                    for name, limits in self.rate_limits.items()
+                },
+                "task_tokens": {name: dict(usage) for name, usage in self.task_tokens.items()},
+            }
@@ -0,0 +1,504 @@
+# Importa módulos da biblioteca padrão usados pela fila de trabalhos.
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+# Importa o cache de viagens completas. O planejamento (crewai, ferramentas) e a
+# conversão para PDF (reportlab) só são importados em `run_trip`, no processo que
+# executa o trabalho: o app enfileira e acompanha sem carregar essa pilha.
+from trip_cache import TripResultCache, trip_cache_key
+
+# Importa o armazenamento de artefatos (workspaces por execução) e o histórico de viagens.
+from trip_artifacts import REPORT_FILES, ArtifactStore
+from trip_db import shared_user_db
+
+# Importa o barramento de eventos: o progresso vem dos eventos da execução, não do stdout.
+from trip_events import RunMetrics, bus, describe, run_context
+
+# Importa a instrumentação (spans de consulta ao cache de viagens).
+from trip_tracing import span
+
+# Importa o buffer de log (linhas limitadas, envio agrupado) usado no log de cada trabalho.
+from trip_utils import StreamlitProcessOutput
+
+
+# Banco SQLite da fila de trabalhos, ao lado do users.db.
+JOBS_DB_PATH = os.getenv("TRIP_JOBS_DB", "jobs.db")
+
+# Número máximo de viagens (crews) executadas ao mesmo tempo por este processo.
+JOB_WORKERS = int(os.getenv("TRIP_JOB_WORKERS", 2))
+
+# Modo de execução: "process" (pool de processos), "thread" (pool de threads no
+# próprio processo) ou "external" (apenas enfileira; workers rodam `trip_worker.py`).
+JOB_MODE = os.getenv("TRIP_JOB_MODE", "process")
+
+# Aquece os workers (importa agentes, ferramentas e PDF) assim que a fila é criada.
+JOB_WARMUP = os.getenv("TRIP_JOB_WARMUP", "1") != "0"
+
+# Controle de admissão: tamanho máximo da fila e trabalhos ativos por usuário.
+JOB_MAX_QUEUE_DEPTH = int(os.getenv("TRIP_JOB_MAX_QUEUE_DEPTH", 20))
+JOB_MAX_ACTIVE_PER_USER = int(os.getenv("TRIP_JOB_MAX_ACTIVE_PER_USER", 2))
+
+# Intervalo de heartbeat dos trabalhos em execução e idade para considerá-los abandonados.
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_STALE_AFTER = int(os.getenv("TRIP_JOB_STALE_AFTER", 180))
+
+# Linhas do log de progresso guardadas por trabalho e intervalo mínimo (em segundos) entre gravações.
+JOB_LOG_LINES = int(os.getenv("TRIP_JOB_LOG_LINES", 200))
+JOB_LOG_FLUSH_INTERVAL = float(os.getenv("TRIP_JOB_LOG_FLUSH_INTERVAL", 0.2))
+
+# Estados possíveis de um trabalho.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+# ======================================================
+# AQUECIMENTO
+# Importa antecipadamente a pilha de agentes, ferramentas e PDF (e monta os
+# estilos), para o primeiro roteiro não pagar esse custo.
+# ======================================================
+def warm_up():
+    import trip_crew  # noqa: F401
+    import trip_pdf
+
+    trip_pdf.markdown_parser()
+    trip_pdf.pdf_styles()
+    return os.getpid()
+
+
+def record_history(workspace, params, username, result):
+    """Guarda os relatórios da execução no histórico do usuário (busca e reabertura no app)."""
+    listing = workspace.listing()
+    reports = {md_file: workspace.read_text(md_file) for md_file in REPORT_FILES if md_file in listing}
+    if not reports:
+        return None
+    timings = {key: result[key] for key in ("metrics", "pdf_timings", "schedule") if key in result}
+    try:
+        return shared_user_db().save_trip(
+            username, workspace.run_id, params, reports, timings=timings, from_cache=result["from_cache"]
+        )
+    except sqlite3.Error:
+        # O histórico é complementar: uma falha ao gravá-lo não invalida a viagem gerada.
+        traceback.print_exc()
+        return None
+
+
+# ======================================================
+# FUNÇÃO: run_trip
+# Executa o pipeline completo de uma viagem (o que antes rodava dentro do
+# `if submitted:` do Streamlit) e devolve um resumo do resultado.
+# ======================================================
+def run_trip(params, progress, run_id, username, store_path=None):
+    """Gera (ou recupera do cache) os relatórios e PDFs da viagem no workspace da execução.
+
+    Cada relatório é gravado no ArtifactStore assim que sua tarefa termina, e o
+    PDF correspondente é gerado em memória, em segundo plano, enquanto as demais
+    tarefas rodam. Nenhum arquivo é escrito no diretório de trabalho. Ao final,
+    a viagem entra no histórico do usuário, pesquisável no app e pelos agentes.
+    """
+    from trip_crew import TripCrew
+    from trip_pdf import submit_render
+    from trip_ratelimit import openai_limiter, tavily_limiter
+    from trip_tools import tool_timings
+
+    store = ArtifactStore(store_path)
+    workspace = store.workspace(run_id, username)
+    # Aproveita para descartar execuções antigas (por idade e tamanho total).
+    store.evict(keep=(run_id,))
+
+    trip_cache = TripResultCache()
+    cache_key = trip_cache_key(
+        params["from_city"], params["destination_city"], params["date_from"], params["date_to"], params["interests"]
+    )
+    with span("trip.cache_lookup", **{"trip.destination": params["destination_city"]}) as active:
+        restored = trip_cache.restore(cache_key, workspace)
+        active.set_attribute("cache.hit", bool(restored))
+    if restored:
+        result = {"from_cache": True}
+        record_history(workspace, params, username, result)
+        return result
+
+    pdf_jobs = {}
+    saved_pdfs = set()
+
+    def save_pdf(pdf_file, future):
+        # Grava o PDF assim que fica pronto, para o app já oferecer o download.
+        if pdf_file not in saved_pdfs and future.exception() is None:
+            workspace.write(pdf_file, future.result()["data"])
+            saved_pdfs.add(pdf_file)
+
+    def render(md_file, markdown):
+        pdf_file = REPORT_FILES[md_file]
+        pdf_jobs[md_file] = submit_render(md_file, markdown)
+        pdf_jobs[md_file].add_done_callback(lambda future: save_pdf(pdf_file, future))
+
+    def on_task_done(md_file, markdown):
+        workspace.write(md_file, markdown)
+        progress(f"{md_file} pronto")
+        # O PDF é gerado em uma thread deste processo enquanto as demais tarefas continuam.
+        render(md_file, markdown)
+
+    def on_event(event):
+        message = describe(event)
+        if message:
+            progress(message)
+
+    progress("Agentes pesquisando e montando o roteiro...")
+    metrics = RunMetrics()
+    with run_context(run_id, username=username), bus.subscribed(run_id, on_event), bus.subscribed(run_id, metrics):
+        schedule = TripCrew(
+            params["from_city"], params["destination_city"], params["date_from"], params["date_to"], params["interests"],
+            on_task_done=on_task_done
+        ).run()
+
+    progress("Finalizando os PDFs...")
+    for md_file in REPORT_FILES:
+        if md_file not in pdf_jobs and workspace.read(md_file) is not None:
+            # Relatório que não passou pelo callback: converte agora, junto com os demais.
+            render(md_file, workspace.read_text(md_file))
+    pdf_timings = []
+    for md_file, job in pdf_jobs.items():
+        try:
+            timing = job.result()
+        except Exception as e:
+            # Um PDF com problema não derruba a viagem: os relatórios em Markdown continuam disponíveis.
+            progress(f"Não foi possível gerar o PDF de {md_file}: {e}")
+            pdf_timings.append({"file": md_file, "error": str(e)})
+            continue
+        save_pdf(REPORT_FILES[md_file], job)
+        pdf_timings.append({key: value for key, value in timing.items() if key != "data"})
+    trip_cache.save(cache_key, workspace, REPORT_FILES)
+    result = {
+        "from_cache": False, "metrics": metrics.snapshot(), "pdf_timings": pdf_timings,
+        # Fila dos limitadores no processo do worker (todas as viagens que passaram por ele).
+        "rate_limiter": {limiter.name: limiter.metrics() for limiter in (openai_limiter, tavily_limiter)},
+        # Tempos de setup, conexão e requisição por provedor de busca, no mesmo processo.
+        "tool_timings": tool_timings.snapshot(),
+        "schedule": {
+            "wall_time": round(schedule.wall_time, 3), "critical_path": schedule.critical_path,
+            "summary": schedule.summary(),
+        },
+    }
+    record_history(workspace, params, username, result)
+    return result
+
+
+# ======================================================
+# EXECUÇÃO DE UM TRABALHO
+# Função de nível de módulo (serializável), usada tanto em threads quanto em
+# processos: abre a própria conexão com o banco para publicar o progresso.
+# ======================================================
+class QueueFull(Exception):
+    """A fila não aceita novos trabalhos no momento (controle de admissão)."""
+
+
+def connect(path):
+    # Autocommit: as transações são abertas explicitamente quando necessário.
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class JobLog:
+    """Container do StreamlitProcessOutput que grava o log do trabalho no banco (exibido pelo app)."""
+
+    def __init__(self, update, job_id):
+        self.update = update
+        self.job_id = job_id
+
+    def text(self, text):
+        self.update("UPDATE jobs SET log=? WHERE id=?", (text, self.job_id))
+
+
+def execute_job(path, job_id, username, params, runner):
+    """Executa `runner(params, progress, run_id=..., username=...)` mantendo o heartbeat do trabalho atualizado.
+
+    Cada mensagem de progresso também entra no log do trabalho: as últimas `JOB_LOG_LINES`
+    linhas, gravadas no máximo a cada `JOB_LOG_FLUSH_INTERVAL` segundos (e ao final).
+    """
+    conn = connect(path)
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def update(sql, args):
+        with lock:
+            conn.execute(sql, args)
+
+    def heartbeat():
+        while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+            update("UPDATE jobs SET heartbeat_at=? WHERE id=?", (time.time(), job_id))
+
+    # Sem deduplicação: passos repetidos (ex: várias buscas) fazem parte do histórico da execução.
+    log = StreamlitProcessOutput(
+        JobLog(update, job_id), max_lines=JOB_LOG_LINES, dedupe_window=0, flush_interval=JOB_LOG_FLUSH_INTERVAL
+    )
+
+    def progress(message):
+        update("UPDATE jobs SET progress=?, heartbeat_at=? WHERE id=?", (message, time.time(), job_id))
+        log.write(f"{time.strftime('%H:%M:%S')} {message}")
+
+    beat = threading.Thread(target=heartbeat, name="trip-job-heartbeat", daemon=True)
+    beat.start()
+    try:
+        # O id do trabalho identifica também a execução (e o seu workspace de artefatos).
+        return runner(params, progress, run_id=job_id, username=username)
+    finally:
+        stop.set()
+        log.close()
+        conn.close()
+
+
+# ======================================================
+# CLASSE: JobQueue
+# Fila de trabalhos persistida em SQLite. Um despachante retira os trabalhos
+# em ordem de chegada e os entrega a um pool (threads ou processos) com um
+# número máximo de crews simultâneas. Vários processos ou máquinas podem
+# compartilhar o mesmo banco: cada trabalho é assumido de forma atômica.
+# ======================================================
+class JobQueue:
+    def __init__(self, runner, path=None, max_workers=JOB_WORKERS, mode=JOB_MODE,
+                 max_queue_depth=JOB_MAX_QUEUE_DEPTH, max_active_per_user=JOB_MAX_ACTIVE_PER_USER):
+        # `runner(params, progress, run_id, username)` executa o trabalho e retorna um dicionário serializável.
+        # No modo "process" ele precisa ser serializável (função de módulo ou functools.partial).
+        self.runner = runner
+        self.path = path or JOBS_DB_PATH
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.max_active_per_user = max_active_per_user
+        self.worker_id = f"{os.uname().nodename if hasattr(os, 'uname') else 'local'}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._create_schema()
+
+        self._pool = self._make_pool()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._wakeup = threading.Event()
+        self._dispatcher = None
+        if self._pool is not None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="trip-job-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _make_pool(self):
+        if self.mode == "process":
+            return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context("spawn"))
+        if self.mode == "thread":
+            return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="trip-job")
+        return None
+
+    def _create_schema(self):
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT NOT NULL DEFAULT '',
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        # Colunas adicionadas depois da primeira versão da tabela.
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, ddl in (("worker", "TEXT"), ("heartbeat_at", "REAL"), ("log", "TEXT NOT NULL DEFAULT ''")):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {ddl}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (username, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def _fetchone(self, sql, args=()):
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+        return self._to_dict(row)
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # --------------------------------------------------
+    # Enfileiramento e consulta
+    # --------------------------------------------------
+    def submit(self, username, params):
+        """Registra o trabalho na fila. Levanta QueueFull se a admissão for recusada."""
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status=?", (QUEUED,)).fetchone()[0]
+                if queued >= self.max_queue_depth:
+                    raise QueueFull("Muitos roteiros na fila no momento. Tente novamente em alguns minutos.")
+                active = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE username=? AND status IN (?, ?)", (username, *ACTIVE_STATUSES)
+                ).fetchone()[0]
+                if active >= self.max_active_per_user:
+                    raise QueueFull(f"Você já tem {active} roteiro(s) em andamento. Aguarde a conclusão.")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, username, params, status, progress, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, username, json.dumps(params, default=str), QUEUED, "Na fila", time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        return self._fetchone("SELECT * FROM jobs WHERE id=?", (job_id,))
+
+    def latest_for(self, username):
+        """Último trabalho do usuário (para retomar a exibição após recarregar a página)."""
+        return self._fetchone(
+            "SELECT * FROM jobs WHERE username=? ORDER BY created_at DESC LIMIT 1", (username,)
+        )
+
+    def queue_position(self, job_id):
+        """Posição do trabalho na fila (1 = próximo a ser executado), ou 0 se não estiver na fila."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status=? AND created_at <= "
+                "(SELECT created_at FROM jobs WHERE id=? AND status=?)",
+                (QUEUED, job_id, QUEUED),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_progress(self, job_id, message):
+        self._execute("UPDATE jobs SET progress=?, heartbeat_at=? WHERE id=?", (message, time.time(), job_id))
+
+    # --------------------------------------------------
+    # Execução
+    # --------------------------------------------------
+    def claim_next(self):
+        """Assume atomicamente o trabalho mais antigo da fila. Retorna o trabalho ou None."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status=? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    self._conn.execute(
+                        "UPDATE jobs SET status=?, progress=?, worker=?, started_at=?, heartbeat_at=? WHERE id=?",
+                        (RUNNING, "Iniciando...", self.worker_id, now, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def _dispatch_loop(self):
+        # Só retira um trabalho da fila quando há uma vaga livre no pool (contrapressão).
+        last_recover = time.monotonic()
+        while True:
+            # Retoma periodicamente trabalhos abandonados (ex: worker de outra máquina que caiu).
+            if time.monotonic() - last_recover >= JOB_STALE_AFTER:
+                try:
+                    self.recover()
+                except Exception:
+                    traceback.print_exc()
+                last_recover = time.monotonic()
+            if not self._slots.acquire(timeout=5):
+                continue
+            try:
+                job = self.claim_next()
+            except Exception:
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._slots.release()
+                self._wakeup.wait(timeout=5)
+                self._wakeup.clear()
+                continue
+            try:
+                future = self._pool.submit(
+                    execute_job, self.path, job["id"], job["username"], job["params"], self.runner
+                )
+            except (BrokenExecutor, RuntimeError):
+                # Um processo do pool morreu (OOM, segfault): o pool fica inutilizável.
+                # Devolve o trabalho à fila e recria o pool, sem derrubar o despachante.
+                traceback.print_exc()
+                self._requeue(job["id"])
+                self._slots.release()
+                self._rebuild_pool()
+                continue
+            future.add_done_callback(lambda f, job_id=job["id"]: self._finish(job_id, f))
+
+    def _rebuild_pool(self):
+        broken, self._pool = self._pool, self._make_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _requeue(self, job_id):
+        self._execute(
+            "UPDATE jobs SET status=?, progress=?, worker=NULL WHERE id=? AND status=?",
+            (QUEUED, "Na fila (retomado)", job_id, RUNNING),
+        )
+        self._wakeup.set()
+
+    def _finish(self, job_id, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            traceback.print_exc()
+            self._execute(
+                "UPDATE jobs SET status=?, progress=?, error=?, finished_at=? WHERE id=?",
+                (FAILED, "Falhou", str(e), time.time(), job_id),
+            )
+        else:
+            self._execute(
+                "UPDATE jobs SET status=?, progress=?, result=?, finished_at=? WHERE id=?",
+                (DONE, "Concluído", json.dumps(result or {}, default=str), time.time(), job_id),
+            )
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    def warm_up(self):
+        """Carrega a pilha de agentes e PDF em segundo plano, em cada worker do pool.
+
+        No modo "process" cada processo do pool importa os módulos uma vez; no modo
+        "thread" eles são importados no próprio processo. Não bloqueia o chamador.
+        """
+        if self._pool is None:
+            return []
+        count = self.max_workers if self.mode == "process" else 1
+        return [self._pool.submit(warm_up) for _ in range(count)]
+
+    def recover(self):
+        """Recoloca na fila trabalhos abandonados (sem heartbeat recente, ex: processo reiniciado)."""
+        limit = time.time() - JOB_STALE_AFTER
+        cur = self._execute(
+            "UPDATE jobs SET status=?, progress=?, worker=NULL WHERE status=? AND COALESCE(heartbeat_at, started_at, 0) < ?",
+            (QUEUED, "Na fila (retomado)", RUNNING, limit),
+        )
+        self._wakeup.set()
+        return cur.rowcount
+
+    def serve_forever(self):
+        """Bloqueia enquanto o despachante roda (usado pelo `trip_worker.py`)."""
+        if self._dispatcher is None:
+            raise RuntimeError("O modo 'external' apenas enfileira trabalhos; use 'process' ou 'thread'.")
+        # O próprio despachante retoma os trabalhos abandonados periodicamente.
+        self._dispatcher.join()
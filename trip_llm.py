@@ -0,0 +1,204 @@
+# Importa a classe LLM do CrewAI, que encapsula as chamadas ao modelo via LiteLLM.
+from crewai import LLM
+
+# Importa o cache semântico persistente, as funções de embedding e a normalização dos pedidos.
+from trip_cache import SemanticCache, canonical_interests, local_embedding, normalize_query, openai_embedding
+
+# Importa o limitador de taxa compartilhado das chamadas à OpenAI e a estimativa de tokens usada nele.
+from trip_ratelimit import estimate_tokens, openai_limiter
+
+# Importa o evento publicado a cada chamada ao modelo.
+from trip_events import LLMCalled, emit, raise_if_cancelled
+
+# Importa a instrumentação das chamadas ao modelo.
+from trip_tracing import span
+
+# Importa o módulo os para ler configurações via variáveis de ambiente.
+import hashlib
+import os
+import threading
+import time
+
+# Base dos callbacks do LiteLLM (o CrewAI repassa a eles o consumo informado pelo provedor).
+from litellm.integrations.custom_logger import CustomLogger
+
+
+# Estimativa de tokens de resposta reservada no limitador antes de cada chamada.
+COMPLETION_TOKENS_ESTIMATE = int(os.getenv("TRIP_COMPLETION_TOKENS_ESTIMATE", 800))
+
+# Tarefas que usam o cache semântico (opt-in por tarefa, separadas por vírgula).
+SEMANTIC_CACHE_TASKS = os.getenv("TRIP_SEMANTIC_CACHE_TASKS", "city_info,language_guide")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("TRIP_SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL = int(os.getenv("TRIP_SEMANTIC_CACHE_TTL", 7 * 24 * 3600))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("TRIP_SEMANTIC_CACHE_MAX_ENTRIES", 2000))
+# "local" (sem rede) ou "openai" (text-embedding-3-small via LiteLLM).
+SEMANTIC_CACHE_EMBEDDING = os.getenv("TRIP_SEMANTIC_CACHE_EMBEDDING", "local")
+
+_semantic_cache = None
+
+
+def semantic_cache():
+    """Cache semântico único por processo, compartilhado por todas as execuções."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl=SEMANTIC_CACHE_TTL,
+            max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+            embed=openai_embedding if SEMANTIC_CACHE_EMBEDDING == "openai" else local_embedding,
+        )
+    return _semantic_cache
+
+
+def semantic_cache_enabled(task):
+    """Indica se a tarefa optou por usar o cache semântico."""
+    enabled = {name.strip() for name in SEMANTIC_CACHE_TASKS.split(",") if name.strip()}
+    return task in enabled
+
+
+def prompt_text(messages):
+    """Converte a lista de mensagens (ou o texto) recebida pelo LLM em um único texto."""
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(f"{m.get('role', '')}: {m.get('content', '')}" for m in messages)
+
+
+def first_turn(messages):
+    """Mensagens do primeiro turno do agente (antes da primeira resposta do modelo)."""
+    if isinstance(messages, str):
+        return messages
+    for index, message in enumerate(messages):
+        if message.get("role") == "assistant":
+            return messages[:index]
+    return messages
+
+
+# Marcador do ReAct do CrewAI para a resposta final da tarefa.
+FINAL_ANSWER = "Final Answer:"
+
+
+# ======================================================
+# CLASSE: UsageRecorder
+# Guarda os tokens informados pelo provedor em uma chamada. O CrewAI chama o
+# callback na thread da chamada; o LiteLLM também o chama na sua thread de
+# log, com o consumo de qualquer chamada em andamento, e essas são ignoradas.
+# ======================================================
+class UsageRecorder(CustomLogger):
+    def __init__(self):
+        super().__init__()
+        self.thread = threading.get_ident()
+        self.usage = None
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        if threading.get_ident() != self.thread or self.usage is not None:
+            return
+        if isinstance(response_obj, dict):
+            self.usage = response_obj.get("usage")
+        else:
+            self.usage = getattr(response_obj, "usage", None)
+
+    def tokens(self):
+        """(prompt, completion) informados pelo provedor, ou None se a resposta não trouxe o consumo."""
+        usage = self.usage
+        if usage is None:
+            return None
+        if isinstance(usage, dict):
+            prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        else:
+            prompt, completion = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+        if prompt is None or completion is None:
+            return None
+        return prompt, completion
+
+
+# ======================================================
+# CLASSE: TripLLM
+# LLM do CrewAI que passa pelo limitador de taxa compartilhado (requisições e
+# tokens por minuto) antes de cada chamada ao provedor. Os tokens publicados em
+# LLMCalled são os informados pelo provedor; sem eles, a estimativa por tamanho
+# do texto é usada e o evento sai marcado com `estimated=True`.
+# ======================================================
+class TripLLM(LLM):
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        # Outra tarefa da execução falhou: não gasta mais chamadas com esta.
+        raise_if_cancelled()
+        prompt_tokens = estimate_tokens(prompt_text(messages))
+        reserved = prompt_tokens + COMPLETION_TOKENS_ESTIMATE
+        recorder = UsageRecorder()
+        with span("llm.call", **{"llm.model": self.model, "llm.prompt_tokens": prompt_tokens}) as active:
+            waited = openai_limiter.acquire(tokens=reserved)
+            started = time.perf_counter()
+            response = super().call(messages, tools, [*(callbacks or []), recorder], available_functions)
+            usage = recorder.tokens()
+            if usage is None:
+                completion_tokens = estimate_tokens(response if isinstance(response, str) else "")
+            else:
+                prompt_tokens, completion_tokens = usage
+            # Ajusta o saldo com o consumo real (ou estimado) da chamada.
+            openai_limiter.adjust(prompt_tokens + completion_tokens - reserved)
+            active.set_attributes({
+                "llm.prompt_tokens": prompt_tokens,
+                "llm.completion_tokens": completion_tokens,
+                "llm.tokens_estimated": usage is None,
+                "llm.rate_limit_wait": round(waited, 3),
+                "llm.cache_hit": False,
+            })
+        emit(
+            LLMCalled, model=self.model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            duration=time.perf_counter() - started, estimated=usage is None,
+        )
+        return response
+
+
+# ======================================================
+# CLASSE: CachedLLM
+# LLM do CrewAI com um cache semântico na frente. Só a resposta final da tarefa
+# é guardada, indexada pelo primeiro prompt do agente: origem, destino, datas e o
+# restante do prompt precisam ser idênticos, e apenas os interesses são
+# comparados por similaridade. Os turnos intermediários do ReAct (Thought/Action)
+# dependem das observações da execução e nunca são reaproveitados.
+# ======================================================
+class CachedLLM(TripLLM):
+    def __init__(self, *args, cache_namespace="default", cache=None, cache_scope=None, cache_interests="",
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_namespace = cache_namespace
+        self.cache = cache or semantic_cache()
+        # `cache_scope` vem de trip_scope(); sem ele (pedido desconhecido) o cache não é usado.
+        self.cache_scope = cache_scope
+        self.cache_interests = cache_interests or ""
+
+    def cache_key(self, prompt):
+        """Chave exata: o pedido (origem, destino, datas) e o prompt sem o texto dos interesses."""
+        template = prompt.replace(self.cache_interests, "") if self.cache_interests else prompt
+        return hashlib.sha256(f"{self.cache_scope}\n{normalize_query(template)}".encode("utf-8")).hexdigest()
+
+    def call(self, messages, *args, **kwargs):
+        # Chamadas com function calling dependem das ferramentas: não passam pelo cache.
+        tools = args[0] if args else kwargs.get("tools")
+        if tools or not self.cache_scope:
+            return super().call(messages, *args, **kwargs)
+
+        first = first_turn(messages)
+        key = self.cache_key(prompt_text(first))
+        interests = " ".join(canonical_interests(self.cache_interests))
+        prompt = prompt_text(messages)
+        # Só o primeiro turno consulta o cache: a resposta final guardada encerra a tarefa de imediato.
+        cached = self.cache.lookup(self.cache_namespace, key, interests) if first is messages else None
+        if cached is not None:
+            with span("llm.call", **{
+                "llm.model": self.model, "llm.prompt_tokens": estimate_tokens(prompt),
+                "llm.completion_tokens": estimate_tokens(cached), "llm.tokens_estimated": True,
+                "llm.cache_hit": True,
+            }):
+                pass
+            emit(
+                LLMCalled, model=self.model, prompt_tokens=estimate_tokens(prompt),
+                completion_tokens=estimate_tokens(cached), duration=0.0, cached=True, estimated=True,
+            )
+            return cached
+
+        response = super().call(messages, *args, **kwargs)
+        if isinstance(response, str) and FINAL_ANSWER in response:
+            self.cache.store(self.cache_namespace, key, interests, response)
+        return response
@@ -0,0 +1,88 @@
+# Importa módulos da biblioteca padrão usados no empacotamento dos relatórios.
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+
+# Importa a instrumentação (span da montagem do ZIP).
+from trip_tracing import span
+
+
+# Memória máxima (em bytes) dos arquivos e ZIPs guardados pelo processo.
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("TRIP_ARTIFACT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+# ======================================================
+# CLASSE: ArtifactCache
+# Guarda em memória os bytes dos artefatos (PDFs, Markdown e ZIPs), endereçados
+# pelo hash do conteúdo, com descarte LRU ao passar do limite de memória. Fica na
+# frente do ArtifactStore: um rerun do app não relê os BLOBs do banco.
+# ======================================================
+class ArtifactCache:
+    def __init__(self, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._size = 0
+
+    def get(self, digest):
+        with self._lock:
+            data = self._items.get(digest)
+            if data is not None:
+                self._items.move_to_end(digest)
+            return data
+
+    def put(self, digest, data):
+        with self._lock:
+            if digest in self._items:
+                self._items.move_to_end(digest)
+                return
+            self._items[digest] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def fetch(self, digest, loader):
+        """Bytes do artefato com o hash `digest`, chamando `loader()` só se não estiverem em memória."""
+        data = self.get(digest)
+        if data is None:
+            data = loader()
+            if data is not None:
+                self.put(digest, data)
+        return data
+
+
+# Cache único por processo (compartilhado entre as sessões do Streamlit).
+artifacts = ArtifactCache()
+
+
+def artifact_bytes(store, run_id, name, info):
+    """Bytes do artefato da execução, servidos da memória enquanto o conteúdo (hash) não mudar."""
+    return artifacts.fetch(info.digest, lambda: store.read(run_id, name))
+
+
+def package_zip(store, run_id, listing):
+    """ZIP em memória com os artefatos de `listing` ({nome: ArtifactInfo}).
+
+    É endereçado pelos hashes das entradas: só é remontado quando algum conteúdo muda.
+    """
+    names = sorted(listing)
+    key = hashlib.sha256("".join(f"{name}:{listing[name].digest};" for name in names).encode()).hexdigest()
+    cached = artifacts.get(f"zip:{key}")
+    if cached is not None:
+        return cached
+
+    with span("zip.package", **{"zip.files": len(names)}) as active:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name in names:
+                # PDFs já são comprimidos: armazená-los sem compressão poupa CPU.
+                compress = zipfile.ZIP_STORED if name.endswith(".pdf") else zipfile.ZIP_DEFLATED
+                archive.writestr(name, artifact_bytes(store, run_id, name, listing[name]), compress_type=compress)
+        data = buffer.getvalue()
+        active.set_attribute("zip.bytes", len(data))
+    artifacts.put(f"zip:{key}", data)
+    return data
@@ -0,0 +1,301 @@
+# Importa bibliotecas para converter Markdown em PDF (markdown-it-py + reportlab).
+import contextvars
+import functools
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+# Importa a instrumentação (um span por PDF gerado, ligado ao trace da viagem mesmo em outro processo).
+from trip_tracing import continued_trace, span, trace_carrier
+
+# Limpeza do Markdown gerado pelo LLM, definida junto ao armazenamento para o app usá-la sem o reportlab.
+from trip_artifacts import clean_markdown
+
+# ======================================================
+# CONVERSÃO MARKDOWN → PDF
+# O Markdown é lido como uma sequência de tokens (markdown-it-py) e cada bloco
+# vira um flowable do reportlab em uma única passada, sem HTML intermediário.
+# ======================================================
+
+from markdown_it import MarkdownIt
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import (
+    SimpleDocTemplate, Paragraph, ListFlowable, ListItem, Preformatted, Table, TableStyle, HRFlowable
+)
+from reportlab.lib import colors
+from xml.sax.saxutils import escape
+
+
+# Processos que geram os PDFs de um trabalho em paralelo. O padrão divide os núcleos
+# da máquina entre os workers da fila (TRIP_JOB_WORKERS), para o total de processos
+# não passar do número de núcleos. 1 = uma thread em segundo plano; 0 = converte na hora.
+PDF_WORKERS = int(os.getenv(
+    "TRIP_PDF_WORKERS", max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("TRIP_JOB_WORKERS", 2))))
+))
+
+# Margens da página (em pontos) e largura útil, usada para dividir as colunas das tabelas.
+PAGE_MARGINS = {"rightMargin": 40, "leftMargin": 40, "topMargin": 60, "bottomMargin": 40}
+CONTENT_WIDTH = A4[0] - PAGE_MARGINS["rightMargin"] - PAGE_MARGINS["leftMargin"]
+
+# Remove tags de blocos HTML soltos no Markdown.
+ANY_TAG = re.compile(r"<.*?>")
+
+# Marcação do reportlab correspondente a cada token de formatação em linha.
+INLINE_TAGS = {
+    "strong_open": "<b>", "strong_close": "</b>",
+    "em_open": "<i>", "em_close": "</i>",
+    "s_open": "<strike>", "s_close": "</strike>",
+    "link_close": "</link>",
+    "softbreak": " ", "hardbreak": "<br/>",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def markdown_parser():
+    """Parser CommonMark com tabelas e tachado, criado uma única vez por processo."""
+    return MarkdownIt("commonmark").enable(["table", "strikethrough"])
+
+
+@functools.lru_cache(maxsize=None)
+def pdf_styles():
+    """Estilos do PDF, montados uma única vez por processo."""
+    styles = getSampleStyleSheet()
+    normal = styles["Normal"]
+    normal.fontName = "Helvetica"
+    normal.fontSize = 11
+    normal.leading = 14
+
+    body = ParagraphStyle("Body", parent=normal, spaceAfter=4)
+    h1 = ParagraphStyle("Heading1", parent=normal, fontSize=16, leading=18,
+                        spaceBefore=6, spaceAfter=8, textColor=colors.HexColor("#1a73e8"))
+    h2 = ParagraphStyle("Heading2", parent=normal, fontSize=13, leading=16,
+                        spaceBefore=4, spaceAfter=6, textColor=colors.darkblue)
+    h3 = ParagraphStyle("Heading3", parent=normal, fontName="Helvetica-Bold", fontSize=12, leading=15,
+                        spaceBefore=2, spaceAfter=4, textColor=colors.darkblue)
+    quote = ParagraphStyle("Quote", parent=body, leftIndent=15, textColor=colors.dimgrey)
+    cell = ParagraphStyle("Cell", parent=normal, fontSize=9, leading=11)
+    header_cell = ParagraphStyle("HeaderCell", parent=cell, fontName="Helvetica-Bold")
+    code = ParagraphStyle("Code", parent=normal, fontName="Courier", fontSize=9, leading=11,
+                          leftIndent=10, spaceAfter=6, backColor=colors.whitesmoke)
+    table = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 4),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+    ])
+    return {
+        "normal": normal, "body": body, "h1": h1, "h2": h2, "h3": h3, "quote": quote,
+        "cell": cell, "header_cell": header_cell, "code": code, "table": table,
+    }
+
+
+def render_inline(children):
+    """Converte os tokens em linha (negrito, itálico, links, código) na marcação do reportlab."""
+    parts = []
+    for token in children or ():
+        if token.type == "text":
+            parts.append(escape(token.content))
+        elif token.type == "code_inline":
+            parts.append(f'<font face="Courier">{escape(token.content)}</font>')
+        elif token.type == "link_open":
+            href = escape(token.attrGet("href") or "", {'"': "&quot;"})
+            parts.append(f'<link href="{href}" color="blue">')
+        elif token.type == "image":
+            parts.append(escape(token.content or token.attrGet("alt") or ""))
+        elif token.type == "html_inline":
+            continue
+        else:
+            parts.append(INLINE_TAGS.get(token.type, ""))
+    return "".join(parts)
+
+
+def markdown_flowables(text):
+    """Percorre os tokens do Markdown uma única vez e gera os flowables do documento.
+
+    Listas (inclusive aninhadas), itens e tabelas são montados em uma pilha; cada
+    bloco de nível superior é entregue (`yield`) assim que termina.
+    """
+    styles = pdf_styles()
+    tokens = markdown_parser().parse(text)
+    # Cada nível da pilha é um dicionário com a lista de flowables que recebe os blocos filhos.
+    stack = [{"kind": "root", "flowables": []}]
+    heading_style = None
+    quote_depth = 0
+
+    def add(flowable):
+        stack[-1]["flowables"].append(flowable)
+
+    for index, token in enumerate(tokens):
+        kind = token.type
+
+        if kind == "heading_open":
+            heading_style = styles.get(token.tag if token.tag in ("h1", "h2") else "h3")
+        elif kind == "heading_close":
+            heading_style = None
+        elif kind == "inline":
+            markup = render_inline(token.children)
+            previous = tokens[index - 1].type
+            if heading_style is not None:
+                add(Paragraph(markup, heading_style))
+            elif previous in ("th_open", "td_open"):
+                add(Paragraph(markup, styles["header_cell" if previous == "th_open" else "cell"]))
+            elif markup.strip():
+                add(Paragraph(markup, styles["quote" if quote_depth else "body"]))
+        elif kind in ("fence", "code_block"):
+            add(Preformatted(token.content.rstrip("\n"), styles["code"]))
+        elif kind == "html_block":
+            plain = ANY_TAG.sub("", token.content).strip()
+            if plain:
+                add(Paragraph(escape(plain), styles["body"]))
+        elif kind == "hr":
+            add(HRFlowable(width="100%", thickness=0.5, color=colors.grey, spaceBefore=4, spaceAfter=4))
+        elif kind == "blockquote_open":
+            quote_depth += 1
+        elif kind == "blockquote_close":
+            quote_depth -= 1
+
+        # Listas: a lista guarda os itens; cada item guarda os próprios blocos (e sublistas).
+        elif kind in ("bullet_list_open", "ordered_list_open"):
+            stack.append({
+                "kind": "list", "flowables": [], "ordered": kind == "ordered_list_open",
+                "start": int(token.attrGet("start") or 1),
+            })
+        elif kind == "list_item_open":
+            stack.append({"kind": "item", "flowables": []})
+        elif kind == "list_item_close":
+            item = stack.pop()
+            stack[-1]["flowables"].append(ListItem(item["flowables"] or [Paragraph("", styles["body"])]))
+        elif kind in ("bullet_list_close", "ordered_list_close"):
+            current = stack.pop()
+            options = {"bulletType": "1", "start": current["start"]} if current["ordered"] else {"bulletType": "bullet"}
+            add(ListFlowable(current["flowables"], leftIndent=15, **options))
+
+        # Tabelas: linhas de células; as linhas do cabeçalho se repetem em cada página, e
+        # uma linha mais alta que a página continua na seguinte (splitInRow).
+        elif kind == "table_open":
+            stack.append({"kind": "table", "flowables": [], "header_rows": 0})
+        elif kind == "tr_open":
+            stack.append({"kind": "row", "flowables": []})
+        elif kind == "tr_close":
+            row = stack.pop()
+            stack[-1]["flowables"].append(row["flowables"])
+        elif kind == "thead_close":
+            stack[-1]["header_rows"] = len(stack[-1]["flowables"])
+        elif kind == "table_close":
+            table = stack.pop()
+            rows = table["flowables"]
+            columns = max((len(row) for row in rows), default=0)
+            if columns:
+                rows = [row + [""] * (columns - len(row)) for row in rows]
+                flowable = Table(rows, colWidths=[CONTENT_WIDTH / columns] * columns,
+                                 repeatRows=table["header_rows"], hAlign="LEFT", splitInRow=1)
+                flowable.setStyle(styles["table"])
+                if table["header_rows"]:
+                    flowable.setStyle(TableStyle([
+                        ("BACKGROUND", (0, 0), (-1, table["header_rows"] - 1), colors.HexColor("#e8f0fe")),
+                    ]))
+                add(flowable)
+
+        # Entrega os blocos de nível superior já concluídos.
+        if len(stack) == 1 and stack[0]["flowables"]:
+            yield from stack[0]["flowables"]
+            stack[0]["flowables"].clear()
+
+
+# Flowables mantidos à frente da página atual durante a montagem do PDF.
+FLOWABLE_LOOKAHEAD = 64
+
+
+class FlowableStream(list):
+    """Lista de flowables preenchida sob demanda a partir de um gerador.
+
+    O `build` do reportlab consome a história pela frente (`len`, `[0]`, `del`,
+    `insert`); a lista guarda só os próximos `lookahead` blocos, e os demais
+    continuam no gerador até a paginação chegar neles. A folga cobre as
+    cadeias de `keepWithNext` (título + primeiro parágrafo).
+    """
+
+    def __init__(self, flowables, lookahead=FLOWABLE_LOOKAHEAD):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def __len__(self):
+        while self._source is not None and super().__len__() < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return super().__len__()
+
+
+def markdown_to_pdf_bytes(text):
+    """
+    Gera em memória o PDF do relatório Markdown, com títulos, listas (aninhadas), tabelas e formatação.
+    100% compatível com Streamlit Cloud.
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, **PAGE_MARGINS)
+    # Os flowables saem do gerador conforme a paginação avança, sem montar a história inteira.
+    doc.build(FlowableStream(markdown_flowables(clean_markdown(text))))
+    return buffer.getvalue()
+
+
+# ======================================================
+# CONVERSÃO EM PARALELO
+# O layout do reportlab é CPU e segura o GIL: threads não convertem dois
+# relatórios ao mesmo tempo. Com PDF_WORKERS > 1, os relatórios vão para um
+# pool de processos criado uma vez por processo de trabalho (limitado pela
+# divisão dos núcleos acima); com 1, uma thread os converte um a um, ainda em
+# paralelo com as tarefas que esperam a rede.
+# ======================================================
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def pdf_executor():
+    """Pool compartilhado (por processo) para a geração de PDFs."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            if PDF_WORKERS > 1:
+                _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=get_context("spawn"))
+            else:
+                _pdf_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trip-pdf")
+        return _pdf_pool
+
+
+def render_timed(name, markdown, carrier=None):
+    """Gera o PDF de um relatório em memória. Retorna o tempo, o tamanho e os bytes (`data`).
+
+    `carrier` (de `trace_carrier()`) liga o span ao trace da viagem quando a conversão roda em outro processo.
+    """
+    started = time.perf_counter()
+    with continued_trace(carrier), span("pdf.convert", **{
+        "pdf.source": name, "pdf.markdown_chars": len(markdown), "pdf.pid": os.getpid(),
+    }) as active:
+        data = markdown_to_pdf_bytes(markdown)
+        active.set_attribute("pdf.bytes", len(data))
+    return {"file": name, "seconds": round(time.perf_counter() - started, 3), "bytes": len(data), "data": data}
+
+
+def submit_render(name, markdown):
+    """Agenda a geração em memória em segundo plano. Retorna um Future com o resultado de `render_timed`."""
+    if PDF_WORKERS > 1:
+        # Os processos do pool não herdam ContextVars: o contexto do trace vai junto, serializado.
+        return pdf_executor().submit(render_timed, name, markdown, trace_carrier())
+    if PDF_WORKERS == 1:
+        # A thread herda o contexto de quem agendou: o span `pdf.convert` fica dentro do span da viagem.
+        return pdf_executor().submit(contextvars.copy_context().run, render_timed, name, markdown)
+    future = Future()
+    try:
+        future.set_result(render_timed(name, markdown))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
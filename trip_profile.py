@@ -0,0 +1,129 @@
+# ==========================================================
+# ⏱️ AgentAI Trip - Perfil de inicialização
+# Mede o tempo de importação de cada fase do app com `python -X importtime`,
+# cada uma em um processo novo (como um cold start):
+#   - login: o que o app carrega antes da tela de login;
+#   - agentes: crewai, langchain, Tavily e DuckDuckGo (trip_crew);
+#   - pdf: markdown-it e reportlab (trip_pdf).
+# Mostra o total de cada fase, o tempo por pacote e os módulos mais lentos.
+#
+# Uso: python trip_profile.py --top 15 --output startup_profile.json
+# ==========================================================
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Módulos importados em cada fase (na ordem em que o app os carrega).
+PHASES = {
+    "login": ["streamlit", "trip_assets", "trip_artifacts", "trip_package", "trip_jobs"],
+    "agentes": ["trip_crew"],
+    "pdf": ["trip_pdf"],
+}
+
+# Linha do -X importtime: "import time:   self |   cumulative | <indentação>módulo".
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """Converte a saída do -X importtime em registros (módulo, profundidade, self e cumulativo em ms)."""
+    records = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append({
+                "module": module,
+                # A indentação cresce 2 espaços por nível de importação aninhada.
+                "depth": (len(indent) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+    return records
+
+
+# Separa, na saída do importtime, o que foi carregado antes da fase medida.
+PHASE_MARKER = "-- trip profile --"
+
+
+def profile_phase(modules, preload=()):
+    """Importa `modules` em um interpretador novo, depois de `preload`, e mede cada importação."""
+    script = "".join(f"import {name}\n" for name in preload)
+    script += f"import sys\nprint({PHASE_MARKER!r}, file=sys.stderr, flush=True)\n"
+    script += "".join(f"import {name}\n" for name in modules)
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        return {"modules": list(modules), "error": errors[-1] if errors else f"código {result.returncode}"}
+
+    stderr = result.stderr.split(PHASE_MARKER, 1)[-1]
+    return summarize(modules, parse_importtime(stderr), wall)
+
+
+def summarize(modules, records, wall):
+    by_package = defaultdict(float)
+    for record in records:
+        by_package[record["module"].split(".")[0]] += record["self_ms"]
+    top_level = [r for r in records if r["depth"] == 0]
+    return {
+        "modules": list(modules),
+        "import_ms": round(sum(r["cumulative_ms"] for r in top_level), 1),
+        "process_seconds": round(wall, 3),
+        "module_count": len(records),
+        "by_package": {
+            name: round(ms, 1) for name, ms in sorted(by_package.items(), key=lambda item: -item[1])
+        },
+        "slowest": sorted(records, key=lambda r: -r["self_ms"]),
+    }
+
+
+def print_phase(name, phase, top):
+    print(f"\n== {name}: {', '.join(phase['modules'])}")
+    if "error" in phase:
+        print(f"   não foi possível importar: {phase['error']}")
+        return
+    print(f"   {phase['import_ms']:.1f} ms em importações ({phase['module_count']} módulos), "
+          f"{phase['process_seconds']:.2f}s com o interpretador")
+    print("   por pacote (self):")
+    for package, ms in list(phase["by_package"].items())[:top]:
+        print(f"     {ms:9.1f} ms  {package}")
+    print("   módulos mais lentos (self / cumulativo):")
+    for record in phase["slowest"][:top]:
+        print(f"     {record['self_ms']:9.1f} / {record['cumulative_ms']:9.1f} ms  {record['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de importação (cold start) do AgentAI Trip")
+    parser.add_argument("--phase", choices=PHASES, action="append", help="fase a medir (padrão: todas)")
+    parser.add_argument("--top", type=int, default=15, help="linhas exibidas por tabela")
+    parser.add_argument("--output", help="grava o perfil completo neste arquivo JSON")
+    args = parser.parse_args()
+
+    report = {}
+    loaded = []
+    for name, modules in PHASES.items():
+        # Cada fase é medida sobre as anteriores já carregadas, como acontece no app.
+        if not args.phase or name in args.phase:
+            report[name] = profile_phase(modules, preload=loaded)
+            print_phase(name, report[name], args.top)
+        loaded += modules
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nPerfil gravado em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# Importa módulos da biblioteca padrão usados pelo limitador de taxa.
+import contextvars
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Importa o evento publicado a cada passagem pelo limitador (espera na fila por execução).
+from trip_events import RateLimitWaited, emit
+
+
+# Limites por minuto dos provedores (ajuste conforme o plano contratado).
+OPENAI_RPM = int(os.getenv("TRIP_OPENAI_RPM", 500))
+OPENAI_TPM = int(os.getenv("TRIP_OPENAI_TPM", 200000))
+TAVILY_RPM = int(os.getenv("TRIP_TAVILY_RPM", 100))
+
+# Banco SQLite usado para compartilhar os limites entre processos ("" desativa e
+# mantém o limite apenas dentro do processo).
+RATE_LIMIT_DB_PATH = os.getenv("TRIP_RATE_LIMIT_DB", "ratelimit.db")
+
+
+def estimate_tokens(text):
+    """Estimativa rápida de tokens (~4 caracteres por token)."""
+    return len(text or "") // 4 + 1
+
+
+# ======================================================
+# PRIORIDADE DA EXECUÇÃO ATUAL
+# Quanto mais perto de terminar, maior a prioridade de uma viagem na fila
+# do limitador (o agendador define o valor antes de executar cada tarefa).
+# ======================================================
+_priority = contextvars.ContextVar("trip_priority", default=0)
+
+
+def set_priority(value):
+    _priority.set(value)
+
+
+def current_priority():
+    return _priority.get()
+
+
+# ======================================================
+# BALDES DE TOKENS
+# `try_take` consome a capacidade se houver saldo e retorna 0; caso contrário
+# retorna quantos segundos faltam para haver saldo suficiente.
+# ======================================================
+class LocalBucket:
+    def __init__(self, rpm, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def try_take(self, tokens):
+        self._refill()
+        return _take(self, tokens)
+
+    def adjust(self, tokens):
+        # Corrige o saldo após saber o consumo real (pode ficar negativo: "dívida").
+        if self.tpm:
+            self._tokens -= tokens
+
+
+class SharedBucket:
+    """Balde gravado em SQLite, compartilhado por todos os processos que usam o mesmo arquivo."""
+
+    def __init__(self, name, rpm, tpm=None, path=RATE_LIMIT_DB_PATH):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                name TEXT PRIMARY KEY,
+                requests REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO rate_buckets VALUES (?, ?, ?, ?)", (name, rpm, tpm or 0, time.time())
+        )
+
+    def _transaction(self, tokens, take):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            requests, balance, updated = self._conn.execute(
+                "SELECT requests, tokens, updated_at FROM rate_buckets WHERE name=?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            elapsed = max(0.0, now - updated)
+            self._requests = min(self.rpm, requests + elapsed * self.rpm / 60)
+            self._tokens = min(self.tpm, balance + elapsed * self.tpm / 60) if self.tpm else 0.0
+            wait = _take(self, tokens) if take else 0.0
+            if not take:
+                self._tokens -= tokens if self.tpm else 0
+            self._conn.execute(
+                "UPDATE rate_buckets SET requests=?, tokens=?, updated_at=? WHERE name=?",
+                (self._requests, self._tokens, now, self.name),
+            )
+            self._conn.execute("COMMIT")
+            return wait
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def try_take(self, tokens):
+        return self._transaction(tokens, take=True)
+
+    def adjust(self, tokens):
+        self._transaction(tokens, take=False)
+
+
+def _take(bucket, tokens):
+    """Consome 1 requisição e `tokens` do balde (já reabastecido) ou calcula a espera."""
+    tokens = min(tokens, bucket.tpm) if bucket.tpm else 0
+    missing_requests = max(0.0, 1 - bucket._requests)
+    missing_tokens = max(0.0, tokens - bucket._tokens) if bucket.tpm else 0.0
+    if missing_requests == 0 and missing_tokens == 0:
+        bucket._requests -= 1
+        bucket._tokens -= tokens
+        return 0.0
+    wait_requests = missing_requests * 60 / bucket.rpm
+    wait_tokens = missing_tokens * 60 / bucket.tpm if bucket.tpm else 0.0
+    return max(wait_requests, wait_tokens)
+
+
+# ======================================================
+# CLASSE: RateLimiter
+# Fila justa na frente de um balde de tokens: chamadas são atendidas por
+# prioridade (viagens mais próximas do fim primeiro) e, dentro da mesma
+# prioridade, por ordem de chegada. Registra o tempo de espera na fila.
+# ======================================================
+class RateLimiter:
+    def __init__(self, name, rpm, tpm=None, shared_path=RATE_LIMIT_DB_PATH):
+        self.name = name
+        self.bucket = SharedBucket(name, rpm, tpm, shared_path) if shared_path else LocalBucket(rpm, tpm)
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._counter = itertools.count()
+        self._waits = deque(maxlen=500)
+        self.calls = 0
+        self.total_wait = 0.0
+
+    def acquire(self, tokens=0, priority=None):
+        """Bloqueia até haver capacidade para 1 requisição com `tokens` tokens. Retorna a espera."""
+        priority = current_priority() if priority is None else priority
+        ticket = (-priority, next(self._counter))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    if self._waiters[0] == ticket:
+                        wait = self.bucket.try_take(tokens)
+                        if wait == 0:
+                            break
+                    else:
+                        wait = 0.5
+                    self._cond.wait(timeout=min(wait, 1.0))
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+        waited = time.monotonic() - started
+        with self._cond:
+            self.calls += 1
+            self.total_wait += waited
+            self._waits.append(waited)
+        emit(RateLimitWaited, limiter=self.name, wait=waited, priority=priority)
+        return waited
+
+    def adjust(self, tokens):
+        """Informa a diferença entre os tokens realmente usados e os estimados no `acquire`."""
+        if tokens:
+            with self._cond:
+                self.bucket.adjust(tokens)
+
+    def metrics(self):
+        """Métricas de espera na fila do limitador."""
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "queued": len(self._waiters),
+                "total_wait": round(self.total_wait, 3),
+                "avg_wait": round(self.total_wait / self.calls, 3) if self.calls else 0.0,
+                "p95_wait": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "max_wait": round(waits[-1], 3) if waits else 0.0,
+            }
+
+
+# Limitadores compartilhados por todos os agentes e execuções do processo.
+openai_limiter = RateLimiter("openai", rpm=OPENAI_RPM, tpm=OPENAI_TPM)
+tavily_limiter = RateLimiter("tavily", rpm=TAVILY_RPM)
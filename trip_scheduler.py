@@ -0,0 +1,188 @@
+# Importa utilitários de concorrência para executar tarefas independentes ao mesmo tempo.
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Importa dataclasses para descrever o resultado do agendamento de forma estruturada.
+from dataclasses import dataclass, field
+
+# Importa o módulo time para medir o tempo de cada tarefa.
+import time
+
+# Importa a prioridade usada pelo limitador de taxa (viagens perto do fim passam na frente).
+from trip_ratelimit import set_priority
+
+# Importa os eventos de início e fim de tarefa publicados no barramento.
+from trip_events import AgentStarted, TaskCompleted, emit, task_context, watch_cancel
+
+# Importa a compactação do contexto entre tarefas (apenas o que a próxima tarefa usa).
+from trip_context import CONTEXT_DIVIDER, compact_context, context_tokens
+
+# Importa a instrumentação (um span por tarefa).
+from trip_tracing import span
+
+
+# ======================================================
+# FUNÇÕES AUXILIARES
+# ======================================================
+def task_dependencies(task):
+    """Retorna a lista de tarefas declaradas em `context=` (as arestas reais do grafo)."""
+    # O CrewAI usa None (ou um marcador interno) quando nenhum contexto foi informado.
+    context = getattr(task, "context", None)
+    return list(context) if isinstance(context, (list, tuple)) else []
+
+
+def task_name(task):
+    """Nome legível da tarefa, usado nos relatórios de tempo."""
+    # Usa o nome do relatório (ex: relatorio_local.md) como identificador estável.
+    return getattr(task, "name", None) or getattr(task, "output_file", None) or f"task_{id(task)}"
+
+
+def dependency_outputs(task):
+    """Saídas (texto) das tarefas de contexto já concluídas."""
+    return [dep.output.raw for dep in task_dependencies(task) if dep.output is not None]
+
+
+def build_context(task):
+    """Contexto da tarefa no formato do CrewAI, compactado para o que ela precisa."""
+    return compact_context(task_name(task), dependency_outputs(task))
+
+
+# ======================================================
+# CLASSE: ScheduleResult
+# Resultado de uma execução agendada em DAG.
+# ======================================================
+@dataclass
+class ScheduleResult:
+    # Saída de cada tarefa (TaskOutput do CrewAI), indexada pelo nome da tarefa.
+    outputs: dict = field(default_factory=dict)
+    # Instantes de início e fim (relativos ao início da execução), em segundos.
+    timings: dict = field(default_factory=dict)
+    # Sequência de tarefas que determinou o tempo total da execução.
+    critical_path: list = field(default_factory=list)
+    # Tempo total de parede da execução.
+    wall_time: float = 0.0
+
+    @property
+    def sequential_time(self):
+        """Soma das durações das tarefas (o tempo que o modo sequencial levaria)."""
+        return sum(end - start for start, end in self.timings.values())
+
+    def summary(self):
+        """Resumo em texto para logs e para a interface."""
+        lines = [f"Tempo total: {self.wall_time:.1f}s (sequencial: {self.sequential_time:.1f}s)"]
+        for name, (start, end) in self.timings.items():
+            lines.append(f"- {name}: {start:.1f}s → {end:.1f}s ({end - start:.1f}s)")
+        lines.append("Caminho crítico: " + " → ".join(self.critical_path))
+        return "\n".join(lines)
+
+
+# ======================================================
+# CLASSE: DagScheduler
+# Executa as tarefas respeitando apenas as dependências declaradas em `context=`,
+# rodando em paralelo as tarefas que não dependem umas das outras.
+# ======================================================
+class DagScheduler:
+    def __init__(self, tasks, max_workers=None):
+        self.tasks = list(tasks)
+        # Por padrão, uma thread por tarefa: o gargalo é espera de rede, não CPU.
+        self.max_workers = max_workers or len(self.tasks) or 1
+        self._validate()
+
+    def _validate(self):
+        """Garante que todas as dependências fazem parte do grafo e que não há ciclos."""
+        known = {id(task) for task in self.tasks}
+        for task in self.tasks:
+            for dep in task_dependencies(task):
+                if id(dep) not in known:
+                    raise ValueError(f"A tarefa '{task_name(task)}' depende de uma tarefa fora do agendamento")
+        # Ordenação topológica simples (algoritmo de Kahn) para detectar ciclos.
+        pending = {id(task): len(task_dependencies(task)) for task in self.tasks}
+        ready = [task for task in self.tasks if pending[id(task)] == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for task in self.tasks:
+                if any(dep is current for dep in task_dependencies(task)):
+                    pending[id(task)] -= 1
+                    if pending[id(task)] == 0:
+                        ready.append(task)
+        if visited != len(self.tasks):
+            raise ValueError("As dependências entre as tarefas formam um ciclo")
+
+    def _execute(self, task, priority=0, cancelled=None):
+        """Executa uma única tarefa com o contexto vindo das suas dependências."""
+        # Prioridade no limitador de taxa = número de tarefas já concluídas nesta execução.
+        set_priority(priority)
+        watch_cancel(cancelled)
+        agent = task.agent
+        agent_role = agent.role if agent else ""
+        tools = task.tools or (agent.tools if agent else None) or []
+        emit(AgentStarted, agent=agent_role, task=task_name(task))
+        started = time.perf_counter()
+        raw_tokens = context_tokens(CONTEXT_DIVIDER.join(dependency_outputs(task)))
+        context = build_context(task)
+        with task_context(task_name(task)), span("trip.task", **{
+            "task.name": task_name(task), "task.agent": agent_role, "task.context_chars": len(context),
+            "task.context_tokens": context_tokens(context), "task.context_raw_tokens": raw_tokens,
+        }) as active:
+            output = task.execute_sync(agent=agent, context=context, tools=tools)
+            active.set_attribute("task.output_chars", len(output.raw or ""))
+        emit(
+            TaskCompleted, task=task_name(task), agent=agent_role,
+            duration=time.perf_counter() - started, output_chars=len(output.raw or ""),
+            context_tokens=context_tokens(context),
+        )
+        return output
+
+    def run(self):
+        """Executa o grafo e retorna um ScheduleResult com tempos e caminho crítico."""
+        result = ScheduleResult()
+        started_at = time.perf_counter()
+        done = set()
+        running = {}
+        cancelled = threading.Event()
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="trip-task")
+        try:
+            while len(done) < len(self.tasks):
+                # Dispara todas as tarefas cujas dependências já terminaram.
+                for task in self.tasks:
+                    if id(task) in done or any(t is task for t in running.values()):
+                        continue
+                    if all(id(dep) in done for dep in task_dependencies(task)):
+                        result.timings[task_name(task)] = (time.perf_counter() - started_at, None)
+                        # Cada tarefa roda em uma cópia do contexto (execução atual, prioridade).
+                        context = contextvars.copy_context()
+                        running[pool.submit(context.run, self._execute, task, len(done), cancelled)] = task
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    name = task_name(task)
+                    result.outputs[name] = future.result()
+                    result.timings[name] = (result.timings[name][0], time.perf_counter() - started_at)
+                    done.add(id(task))
+        except BaseException:
+            # Uma tarefa falhou: a falha sobe na hora, sem esperar as demais. As tarefas
+            # em andamento param na próxima chamada ao modelo (TaskCancelled).
+            cancelled.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+        result.wall_time = time.perf_counter() - started_at
+        result.critical_path = self._critical_path(result.timings)
+        return result
+
+    def _critical_path(self, timings):
+        """Reconstrói o caminho crítico a partir da tarefa que terminou por último."""
+        by_name = {task_name(task): task for task in self.tasks}
+        current = max(by_name.values(), key=lambda task: timings[task_name(task)][1])
+        path = [task_name(current)]
+        while task_dependencies(current):
+            # A dependência que terminou por último é a que segurou o início desta tarefa.
+            current = max(task_dependencies(current), key=lambda dep: timings[task_name(dep)][1])
+            path.append(task_name(current))
+        return list(reversed(path))
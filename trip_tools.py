@@ -6,50 +6,467 @@
 # que podem ser usadas por agentes de IA (Agents) dentro do ecossistema CrewAI.
 from crewai.tools import tool
 
-# Importa a classe TavilySearch, que permite realizar buscas estruturadas na web
-# utilizando a API do Tavily (um mecanismo de busca orientado a IA).
-from langchain_tavily import TavilySearch
-
 # Importa o DuckDuckGoSearchResults, ferramenta que executa buscas na internet
 # usando o mecanismo de busca DuckDuckGo.
 from langchain_community.tools import DuckDuckGoSearchResults
 
+# Importa o requests e as classes do urllib3 usadas no pool de conexões HTTP
+# (a API do Tavily é chamada diretamente, reaproveitando conexões keep-alive).
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Importa módulos da biblioteca padrão para configuração, sincronização e medição de tempo.
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Importa o cache persistente (SQLite) e a normalização de consultas.
+from trip_cache import PersistentCache, normalize_query
+
+# Importa o limitador de taxa compartilhado das chamadas ao Tavily.
+from trip_ratelimit import tavily_limiter
+
+# Importa o decorador que publica cada chamada de ferramenta no barramento de eventos
+# e o usuário dono da execução atual.
+from trip_events import current_user, tool_events
+
+# Importa o histórico de viagens dos usuários (busca FTS5 no users.db).
+from trip_db import shared_user_db
+
+# Importa a marcação de atributos no span atual (acertos de cache).
+from trip_tracing import set_attributes
+
+
+# ======================================================
+# CACHE DE BUSCAS
+# Consultas repetidas entre clientes (clima, segurança, "melhores restaurantes em X")
+# são respondidas a partir do disco, economizando latência e cota das APIs.
+# ======================================================
+
+# TTL padrão (7 dias) e TTL curto (6 horas) para consultas que mudam rápido.
+SEARCH_CACHE_TTL = int(os.getenv("TRIP_SEARCH_CACHE_TTL", 7 * 24 * 3600))
+SEARCH_CACHE_SHORT_TTL = int(os.getenv("TRIP_SEARCH_CACHE_SHORT_TTL", 6 * 3600))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("TRIP_SEARCH_CACHE_MAX_ENTRIES", 5000))
+
+# Termos que indicam informação volátil (clima, eventos, preços do momento).
+VOLATILE_TERMS = ("clima", "tempo", "previsao", "weather", "forecast", "evento", "event", "hoje", "preco", "price")
+
+search_caches = {
+    "tavily": PersistentCache("search:tavily", ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES),
+    "duckduckgo": PersistentCache("search:duckduckgo", ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES),
+}
+
+
+def search_ttl(key):
+    """Escolhe o TTL da entrada conforme o tipo de informação consultada."""
+    return SEARCH_CACHE_SHORT_TTL if any(term in key for term in VOLATILE_TERMS) else SEARCH_CACHE_TTL
+
+
+def cached_search(provider, query, fetch):
+    """Consulta o cache do provedor e só chama `fetch(query)` em caso de falta."""
+    cache = search_caches[provider]
+    key = normalize_query(query)
+    result = cache.get(key)
+    set_attributes(**{f"cache.hit.{provider}": result is not None})
+    if result is None:
+        result = fetch(query)
+        # Resultados vazios não são gravados, para não fixar uma falha temporária.
+        if result:
+            cache.set(key, result, ttl=search_ttl(key))
+    return result
+
+
+# ======================================================
+# CLIENTES COMPARTILHADOS
+# Os clientes de busca e a sessão HTTP são criados uma única vez por processo
+# e reaproveitados por todas as chamadas (e threads), evitando novos
+# handshakes TCP/TLS a cada uso das ferramentas.
+# ======================================================
+
+TAVILY_API_URL = "https://api.tavily.com/search"
+HTTP_POOL_SIZE = int(os.getenv("TRIP_HTTP_POOL_SIZE", 16))
+HTTP_TIMEOUT = float(os.getenv("TRIP_HTTP_TIMEOUT", 30))
+
+
+class ToolTimings:
+    """Contadores de tempo por provedor: criação de clientes, conexões novas e requisições.
+
+    Todas as fases usam a mesma chave (o nome do provedor, ex: "tavily"), para que
+    setup, connect e request de um provedor possam ser comparados.
+    """
+
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._data = {}
+        # Janela das latências mais recentes de cada provedor (usada pela busca com hedge).
+        self._window = window
+        self._samples = {}
+
+    def record(self, provider, kind, seconds):
+        # `kind` é "setup" (criação do cliente), "connect" (TCP/TLS) ou "request" (chamada completa).
+        with self._lock:
+            count, total = self._data.get((provider, kind), (0, 0.0))
+            self._data[(provider, kind)] = (count + 1, total + seconds)
+            if kind == "request":
+                self._samples.setdefault(provider, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, provider, q, default=None, min_samples=5):
+        """Percentil `q` (0-1) das latências recentes do provedor, ou `default` se houver poucas amostras."""
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if len(samples) < min_samples:
+            return default
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self):
+        """Retorna {provedor: {tipo: {"count": n, "seconds": s}}}."""
+        with self._lock:
+            result = {}
+            for (provider, kind), (count, total) in self._data.items():
+                result.setdefault(provider, {})[kind] = {"count": count, "seconds": round(total, 4)}
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+            self._samples.clear()
+
+
+tool_timings = ToolTimings()
+
+# Provedor de cada host chamado pela sessão compartilhada (hosts fora da lista usam o próprio nome).
+HOST_PROVIDERS = {"api.tavily.com": "tavily"}
+
+
+# Conexões do urllib3 que registram quanto tempo leva cada conexão nova (TCP + TLS).
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        tool_timings.record(HOST_PROVIDERS.get(self.host, self.host), "connect", time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        tool_timings.record(HOST_PROVIDERS.get(self.host, self.host), "connect", time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """Adaptador HTTP com pool keep-alive e medição de tempo de conexão."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(name, factory, provider=None):
+    """Retorna o cliente `name`, criando-o com `factory()` apenas na primeira chamada.
+
+    O tempo de criação é registrado em `tool_timings` sob `provider` (ou `name`).
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                start = time.perf_counter()
+                client = factory()
+                tool_timings.record(provider or name, "setup", time.perf_counter() - start)
+                _clients[name] = client
+    return client
+
+
+def _build_http_session():
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def http_session():
+    """Sessão HTTP única do processo (o pool do urllib3 é seguro entre threads)."""
+    # O Tavily é o cliente da sessão: a criação dela conta como o setup do provedor.
+    return shared_client("http", _build_http_session, provider="tavily")
+
+
+def run_tavily(query):
+    """Executa uma busca no Tavily, sem cache, usando a sessão HTTP compartilhada."""
+    # Espera a vez no limitador compartilhado (evita rajadas seguidas de HTTP 429).
+    tavily_limiter.acquire()
+    start = time.perf_counter()
+    response = http_session().post(
+        TAVILY_API_URL,
+        # Limita o número máximo de resultados a 4.
+        json={"query": query, "max_results": 4},
+        headers={"Authorization": f"Bearer {os.getenv('TAVILY_API_KEY', '')}"},
+        timeout=HTTP_TIMEOUT,
+    )
+    response.raise_for_status()
+    result = response.json()
+    tool_timings.record("tavily", "request", time.perf_counter() - start)
+    return result
+
+
+def run_duckduckgo(query):
+    """Executa uma busca no DuckDuckGo, sem cache, com o cliente compartilhado."""
+    # Instância única do mecanismo de busca DuckDuckGo,
+    # limitando também a 4 resultados e ativando o modo verboso (debug detalhado).
+    search_tool = shared_client(
+        "duckduckgo", lambda: DuckDuckGoSearchResults(num_results=4, verbose=True), provider="duckduckgo"
+    )
+    start = time.perf_counter()
+    result = search_tool.run(query)
+    tool_timings.record("duckduckgo", "request", time.perf_counter() - start)
+    return result
+
+
+# ======================================================
+# BUSCA EM LOTE
+# Executa várias consultas ao mesmo tempo, para que um agente reúna clima,
+# eventos e segurança em um único turno do LLM.
+# ======================================================
+
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("TRIP_SEARCH_BATCH_MAX_QUERIES", 8))
+SEARCH_MAX_WORKERS = int(os.getenv("TRIP_SEARCH_MAX_WORKERS", 8))
+
+SEARCH_PROVIDERS = {
+    "tavily": run_tavily,
+    "duckduckgo": run_duckduckgo,
+}
+
+
+def search_executor():
+    """Pool de threads compartilhado pelas buscas concorrentes."""
+    return shared_client(
+        "executor", lambda: ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="trip-search")
+    )
+
+
+# ======================================================
+# BUSCA COM HEDGE
+# Consulta o provedor principal e, se ele demorar mais que o percentil
+# configurado das suas latências recentes (ou falhar, ex: limite de taxa),
+# dispara a mesma consulta no provedor secundário e usa quem responder primeiro.
+# ======================================================
+
+HEDGE_PERCENTILE = float(os.getenv("TRIP_HEDGE_PERCENTILE", 0.9))
+HEDGE_DEFAULT_DELAY = float(os.getenv("TRIP_HEDGE_DEFAULT_DELAY", 3.0))
+HEDGE_DEADLINE = float(os.getenv("TRIP_HEDGE_DEADLINE", HTTP_TIMEOUT))
+
+
+def hedge_executor():
+    """Pool separado do pool de lote, para que uma busca em lote não espere por si mesma."""
+    return shared_client(
+        "hedge_executor", lambda: ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS * 2, thread_name_prefix="trip-hedge")
+    )
+
+
+def hedged_search(query, primary="tavily", secondary="duckduckgo"):
+    """Busca no provedor principal com fallback/hedge para o secundário dentro de um prazo."""
+    started = time.monotonic()
+    pool = hedge_executor()
+    futures = {pool.submit(contextvars.copy_context().run, cached_search, primary, query, SEARCH_PROVIDERS[primary]): primary}
+
+    # Espera o principal até o percentil de latência observado (ou o atraso padrão).
+    delay = tool_timings.percentile(primary, HEDGE_PERCENTILE, default=HEDGE_DEFAULT_DELAY)
+    wait(futures, timeout=delay)
+
+    errors = []
+    hedged = False
+    pending = set(futures)
+    while pending:
+        for future in [f for f in pending if f.done()]:
+            pending.discard(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                # Erros e limite de taxa (HTTP 429) viram fallback imediato.
+                errors.append(f"{futures[future]}: {e}")
+                continue
+            if result:
+                return result
+            errors.append(f"{futures[future]}: sem resultados")
+
+        if not hedged:
+            # O principal está lento ou falhou: dispara a mesma consulta no secundário.
+            hedged = True
+            future = pool.submit(contextvars.copy_context().run, cached_search, secondary, query, SEARCH_PROVIDERS[secondary])
+            futures[future] = secondary
+            pending.add(future)
+
+        remaining = HEDGE_DEADLINE - (time.monotonic() - started)
+        if remaining <= 0 or not pending:
+            break
+        wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    if pending:
+        errors.append(f"prazo de {HEDGE_DEADLINE:.0f}s esgotado")
+    return "Erro na busca: " + "; ".join(errors)
+
+
+def search_batch(queries, provider=None):
+    """Busca todas as consultas em paralelo e devolve {consulta: resultados}, sem URLs repetidas.
+
+    Sem `provider`, cada consulta usa a busca com hedge entre Tavily e DuckDuckGo.
+    """
+    # Uma consulta avulsa (str) vale como lote de um item, e não como uma lista de caracteres.
+    if isinstance(queries, str):
+        queries = [queries]
+    # Consultas equivalentes (mesma chave normalizada) são buscadas uma única vez.
+    unique = {}
+    for query in queries or []:
+        if str(query).strip():
+            unique.setdefault(normalize_query(query), str(query).strip())
+    selected = list(unique.values())[:SEARCH_BATCH_MAX_QUERIES]
+
+    if provider is None:
+        futures = {query: search_executor().submit(contextvars.copy_context().run, hedged_search, query) for query in selected}
+    else:
+        fetch = SEARCH_PROVIDERS[provider]
+        futures = {query: search_executor().submit(contextvars.copy_context().run, cached_search, provider, query, fetch) for query in selected}
+
+    merged = {}
+    seen_urls = set()
+    for query, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            merged[query] = f"Erro na busca: {e}"
+            continue
+        if isinstance(result, dict) and isinstance(result.get("results"), list):
+            # Mantém cada URL apenas na primeira consulta que a encontrou.
+            items = []
+            for item in result["results"]:
+                url = item.get("url")
+                if url and url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                items.append(item)
+            merged[query] = items
+        else:
+            merged[query] = result
+    return merged
+
 
 # Define uma classe que agrupa ferramentas de busca na internet.
 class SearchTools:
     # Cria um método decorado com @tool, que indica ao CrewAI que esta função
     # é uma ferramenta nomeada "Pesquisa na internet".
     @tool("Pesquisa na internet")
+    @tool_events("search_tavily")
     def search_tavily(query: str = "") -> str:
         """
         Função que realiza buscas na internet usando a API Tavily.
         Ideal para obter informações mais recentes e estruturadas.
         """
-        # Instancia o objeto TavilySearch, limitando o número máximo de resultados a 4.
-        search_tavily = TavilySearch(max_results=4)
-        # Executa a busca com base no termo (query) fornecido como argumento.
-        search_res = search_tavily.invoke(query)
+        # Busca primeiro no cache persistente; só consulta a API em caso de falta.
+        search_res = cached_search("tavily", query, run_tavily)
         # Retorna o resultado da busca (normalmente uma lista ou texto estruturado).
         return search_res
 
     # Cria uma segunda ferramenta para pesquisa, agora utilizando o DuckDuckGo.
     @tool("Pesquisa na internet com DuckDuckGo")
+    @tool_events("search_duckduckgo")
     def search_duckduckgo(query: str):
         """
         Função que realiza uma busca na web usando o DuckDuckGo.
         Retorna uma lista de resultados de pesquisa.
         """
-        # Cria uma instância do mecanismo de busca DuckDuckGo,
-        # limitando também a 4 resultados e ativando o modo verboso (debug detalhado).
-        search_tool = DuckDuckGoSearchResults(num_results=4, verbose=True)
-        # Executa a busca com o termo especificado e retorna os resultados.
-        return search_tool.run(query)
+        # Executa a busca (passando pelo cache) e retorna os resultados.
+        return cached_search("duckduckgo", query, run_duckduckgo)
+
+    # Ferramenta de busca combinada: Tavily com hedge/fallback para o DuckDuckGo.
+    @tool("Pesquisa na internet (Tavily + DuckDuckGo)")
+    @tool_events("search_web")
+    def search_web(query: str = "") -> str:
+        """
+        Função que realiza buscas na internet usando a API Tavily e, se ela demorar ou falhar,
+        o DuckDuckGo. Retorna a resposta que chegar primeiro.
+        """
+        return hedged_search(query)
+
+    # Ferramenta de busca em lote: várias consultas independentes em um único turno.
+    @tool("Pesquisa na internet em lote")
+    @tool_events("search_many")
+    def search_many(queries: list[str]) -> str:
+        """
+        Realiza várias buscas na internet ao mesmo tempo e retorna os resultados agrupados por consulta.
+        Use quando precisar de informações independentes (ex: clima, eventos e segurança) de uma só vez.
+        Exemplo de entrada: ["clima em Lisboa em maio", "eventos em Lisboa em maio", "segurança em Lisboa"]
+        """
+        # Serializa em JSON para o agente receber um texto estruturado.
+        return json.dumps(search_batch(queries), ensure_ascii=False, default=str)
+
+
+# Viagens do histórico devolvidas por consulta e tamanho máximo do roteiro de cada uma.
+HISTORY_MAX_TRIPS = 3
+HISTORY_MAX_CHARS = int(os.getenv("TRIP_HISTORY_MAX_CHARS", 6000))
+
+
+def search_history(query, username):
+    """Roteiros anteriores do usuário que casam com `query`, prontos para o agente reaproveitar."""
+    if not username:
+        return []
+    db = shared_user_db()
+    found = []
+    for summary in db.search_trips(username, query, limit=HISTORY_MAX_TRIPS):
+        trip = db.get_trip(username, summary["id"])
+        itinerary = trip["reports"].get("roteiro_viagem.md", "")
+        found.append({
+            "destino": trip["destination"],
+            "origem": trip["from_city"],
+            "datas": f"{trip['date_from']} a {trip['date_to']}",
+            "interesses": trip["interests"],
+            "roteiro": itinerary[:HISTORY_MAX_CHARS],
+        })
+    return found
+
+
+# Define uma classe com ferramentas de consulta ao histórico de viagens.
+class HistoryTools:
+    @tool("Consulta roteiros anteriores")
+    @tool_events("search_past_trips")
+    def search_past_trips(query: str = "") -> str:
+        """
+        Busca roteiros que este usuário já gerou (por destino, interesses ou conteúdo).
+        Use antes de pesquisar na internet: um roteiro anterior para o mesmo destino pode ser adaptado.
+        Exemplo de entrada: 'Lisboa museus gastronomia'
+        """
+        trips = search_history(query, current_user())
+        if not trips:
+            return "Nenhum roteiro anterior encontrado."
+        return json.dumps(trips, ensure_ascii=False)
 
 
 # Define uma classe para ferramentas de cálculo matemático.
 class CalculatorTools:
     # Declara o método como uma ferramenta CrewAI, nomeada "Faça um cálculo".
     @tool("Faça um cálculo")
+    @tool_events("calculate")
     def calculate(operation):
         """
         Realiza cálculos matemáticos básicos.
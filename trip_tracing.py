@@ -0,0 +1,174 @@
+# Importa módulos da biblioteca padrão usados pela instrumentação.
+import os
+import threading
+from contextlib import contextmanager
+
+
+# Liga a instrumentação (desligada por padrão) e define o arquivo JSONL (um span por linha) que recebe os spans.
+TRACING_ENABLED = os.getenv("TRIP_TRACING", "0") == "1"
+TRACE_FILE = os.getenv("TRIP_TRACE_FILE", "traces.jsonl")
+
+# Tamanho máximo do arquivo de spans: ao passar disso, ele vira `<arquivo>.1` e um novo é iniciado.
+TRACE_MAX_BYTES = int(os.getenv("TRIP_TRACE_MAX_BYTES", 50 * 1024 * 1024))
+
+# Nome do serviço gravado em cada span.
+SERVICE_NAME = "agentai-trip"
+
+
+# ======================================================
+# EXPORTADOR JSONL
+# Grava os spans localmente, sem depender de coletor ou rede. Cada linha é o
+# JSON do span (mesmo formato de `span.to_json()`), fácil de ler com pandas/jq.
+# Vários processos escrevem no mesmo arquivo: cada exportação é um único append,
+# e a rotação usa `os.replace` (atômico), então no pior caso alguns spans de um
+# processo concorrente terminam no arquivo antigo.
+# ======================================================
+def _jsonl_exporter(path):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonlSpanExporter(SpanExporter):
+        def __init__(self):
+            self.path = path
+            self._lock = threading.Lock()
+
+        def export(self, spans):
+            lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+            try:
+                with self._lock:
+                    self._rotate()
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(lines)
+            except OSError:
+                return SpanExportResult.FAILURE
+            return SpanExportResult.SUCCESS
+
+        def _rotate(self):
+            if TRACE_MAX_BYTES <= 0:
+                return
+            try:
+                if os.path.getsize(self.path) < TRACE_MAX_BYTES:
+                    return
+                os.replace(self.path, self.path + ".1")
+            except FileNotFoundError:
+                # Ainda não existe, ou outro processo acabou de rotacionar.
+                pass
+
+        def shutdown(self):
+            pass
+
+    return JsonlSpanExporter()
+
+
+# ======================================================
+# TRACER
+# Criado uma única vez por processo (inclusive nos processos do pool de trabalhos),
+# no primeiro span: o OpenTelemetry só é importado quando há algo a instrumentar.
+# O OpenTelemetry é opcional: sem ele (ou sem TRIP_TRACING=1), os spans viram no-op.
+# ======================================================
+trace = None
+_tracer = None
+_tracer_ready = False
+_tracer_lock = threading.Lock()
+
+
+def tracer():
+    """Tracer do processo, ou None se a instrumentação estiver desativada ou indisponível."""
+    global trace, _tracer, _tracer_ready
+    if _tracer_ready:
+        return _tracer
+    with _tracer_lock:
+        if not _tracer_ready:
+            if TRACING_ENABLED:
+                try:
+                    from opentelemetry import trace as otel_trace
+                    from opentelemetry.sdk.resources import Resource
+                    from opentelemetry.sdk.trace import TracerProvider
+                    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                except ImportError:
+                    otel_trace = None
+                if otel_trace is not None:
+                    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+                    provider.add_span_processor(BatchSpanProcessor(_jsonl_exporter(TRACE_FILE)))
+                    otel_trace.set_tracer_provider(provider)
+                    trace = otel_trace
+                    _tracer = otel_trace.get_tracer("trip")
+            _tracer_ready = True
+    return _tracer
+
+
+class _NoopSpan:
+    """Span vazio usado quando o OpenTelemetry não está disponível."""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+    def end(self, end_time=None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _clean(attributes):
+    # O OpenTelemetry aceita apenas str, bool, int, float (ou listas deles); None é descartado.
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in attributes.items() if value is not None
+    }
+
+
+@contextmanager
+def span(name, **attributes):
+    """Abre um span filho do span atual. O contexto segue para threads criadas com `copy_context().run`."""
+    current = tracer()
+    if current is None:
+        yield NOOP_SPAN
+        return
+    with current.start_as_current_span(name, attributes=_clean(attributes)) as active:
+        yield active
+
+
+def start_span(name, **attributes):
+    """Inicia um span sem torná-lo o atual (para início e fim em callbacks distintos)."""
+    current = tracer()
+    if current is None:
+        return NOOP_SPAN
+    return current.start_span(name, attributes=_clean(attributes))
+
+
+def set_attributes(**attributes):
+    """Acrescenta atributos (tokens, tamanhos, cache) ao span atual, se houver."""
+    if tracer() is not None:
+        trace.get_current_span().set_attributes(_clean(attributes))
+
+
+def trace_carrier():
+    """Contexto do span atual serializado (W3C traceparent), para continuar o trace em outro processo."""
+    if tracer() is None:
+        return None
+    from opentelemetry import propagate
+
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+@contextmanager
+def continued_trace(carrier):
+    """Torna atual, dentro do bloco, o contexto recebido de `trace_carrier()` em outro processo."""
+    if not carrier or tracer() is None:
+        yield
+        return
+    from opentelemetry import context, propagate
+
+    token = context.attach(propagate.extract(carrier))
+    try:
+        yield
+    finally:
+        context.detach(token)
@@ -1,6 +1,3 @@
-# Importa a biblioteca Streamlit, usada para construir interfaces web interativas em Python.
-import streamlit as st
-
 # Importa o módulo sys, que permite manipular o fluxo de entrada e saída padrão (stdin, stdout, stderr).
 import sys
 
@@ -14,37 +11,85 @@ from io import StringIO
 import re
 
 
+# Importa deque (fila com tamanho máximo), usada como buffer circular das linhas exibidas.
+from collections import deque
+
+# Importa o módulo time para agrupar as atualizações da interface em intervalos.
+import time
+
+# Importa o módulo threading para proteger o buffer quando várias threads escrevem ao mesmo tempo.
+import threading
+
+
+# Expressão regular (compilada uma única vez) para capturar códigos ANSI (cores e formatações do terminal).
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+# Prefixos de mensagens de debug do LiteLLM que não devem aparecer no app.
+IGNORED_PREFIXES = ('LiteLLM.Info:', 'Provider List:')
+
+
 # Define uma classe responsável por capturar e exibir saídas de processos no Streamlit.
+# O container só precisa de um método `text(texto)`: também é usado pelos workers da
+# fila, que gravam o log da execução no banco para o app exibir.
 class StreamlitProcessOutput:
-    def __init__(self, container):
+    def __init__(self, container, max_lines=2000, tail_lines=None, dedupe_window=1000, flush_interval=0.2,
+                 on_timer=None):
         # Armazena a referência ao container Streamlit (ex: `st.empty()` ou `st.container()`),
         # que será usado para exibir o texto dinamicamente.
         self.container = container
 
-        # Guarda o texto acumulado que será exibido no app.
-        self.output_text = ""
+        # Buffer circular com as linhas exibidas: as mais antigas são descartadas ao passar de `max_lines`.
+        self.lines = deque(maxlen=max_lines)
+
+        # Quantidade de linhas exibidas no app (None = todas as linhas do buffer).
+        self.tail_lines = tail_lines
 
-        # Mantém um conjunto (set) de linhas já vistas, para evitar repetições.
+        # Janela limitada de linhas já vistas, para evitar repetições sem crescer indefinidamente
+        # (0 desativa a deduplicação).
+        self.seen_order = deque(maxlen=dedupe_window)
         self.seen_lines = set()
 
+        # Intervalo mínimo (em segundos) entre duas atualizações do container.
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        # Envio agendado das linhas que chegaram dentro do intervalo (sem esperar a próxima escrita).
+        # `on_timer(thread)` prepara a thread do timer antes de iniciá-la (ex: contexto do Streamlit).
+        self._timer = None
+        self.on_timer = on_timer
+
+    @property
+    def output_text(self):
+        """Texto acumulado atualmente no buffer."""
+        return '\n'.join(self.lines)
+
     def clean_text(self, text):
         """Limpa o texto removendo caracteres de controle e logs desnecessários."""
-        # Cria uma expressão regular para capturar códigos ANSI (cores e formatações do terminal).
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-
-        # Remove esses códigos do texto.
-        text = ansi_escape.sub('', text)
+        # Remove os códigos ANSI do texto.
+        text = ANSI_ESCAPE.sub('', text)
 
         # Ignora mensagens de debug específicas do LiteLLM.
-        if text.strip().startswith('LiteLLM.Info:') or text.strip().startswith('Provider List:'):
+        if text.strip().startswith(IGNORED_PREFIXES):
             return None
 
-        # Caso existam, poderia remover códigos de formatação específicos (comentado por enquanto).
-        # text = text.replace('[1m', '').replace('[95m', '').replace('[92m', '').replace('[00m', '')
-
         # Retorna o texto limpo.
         return text
 
+    def _remember(self, line):
+        """Registra a linha na janela de deduplicação. Retorna False se ela já foi vista."""
+        if not self.seen_order.maxlen:
+            return True
+        if line in self.seen_lines:
+            return False
+        if len(self.seen_order) == self.seen_order.maxlen:
+            # A linha mais antiga sai da janela e pode voltar a ser exibida no futuro.
+            self.seen_lines.discard(self.seen_order[0])
+        self.seen_order.append(line)
+        self.seen_lines.add(line)
+        return True
+
     def write(self, text):
         """Método chamado automaticamente quando algo é impresso (print) no terminal."""
         # Primeiro, limpa o texto.
@@ -54,45 +99,78 @@ class StreamlitProcessOutput:
         if cleaned_text is None:
             return
 
-        # Divide o texto em linhas para tratar cada uma separadamente.
-        lines = cleaned_text.split('\n')
-        new_lines = []
-
-        # Percorre todas as linhas.
-        for line in lines:
-            # Remove espaços extras.
-            line = line.strip()
-
-            # Adiciona a linha apenas se for nova e não vazia.
-            if line and line not in self.seen_lines:
-                self.seen_lines.add(line)
-                new_lines.append(line)
-
-        # Se houver novas linhas, atualiza o texto exibido.
-        if new_lines:
-            # Junta as novas linhas em uma única string separada por quebras de linha.
-            new_content = '\n'.join(new_lines)
-
-            # Atualiza o conteúdo acumulado (mantendo histórico das mensagens anteriores).
-            self.output_text = f"{self.output_text}\n{new_content}" if self.output_text else new_content
-
-            # Atualiza o container Streamlit em tempo real com o texto novo.
-            self.container.text(self.output_text)
+        with self._lock:
+            # Adiciona ao buffer apenas as linhas novas e não vazias.
+            for line in cleaned_text.split('\n'):
+                line = line.strip()
+                if line and self._remember(line):
+                    self.lines.append(line)
+                    self._dirty = True
+
+        # Atualiza o container no máximo uma vez a cada `flush_interval` segundos.
+        self.flush()
+
+    def render(self):
+        """Atualiza o container imediatamente com o conteúdo do buffer."""
+        with self._lock:
+            if not self._dirty:
+                return
+            lines = list(self.lines)
+            if self.tail_lines:
+                lines = lines[-self.tail_lines:]
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        self.container.text('\n'.join(lines))
 
     def flush(self):
-        """Método obrigatório para compatibilidade com sys.stdout, mas não faz nada aqui."""
-        pass
+        """Compatível com sys.stdout: envia as linhas pendentes se o intervalo mínimo já passou,
+        ou agenda o envio para o fim do intervalo."""
+        with self._lock:
+            if not self._dirty:
+                return
+            wait = self._last_flush + self.flush_interval - time.monotonic()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._deferred_render)
+                    self._timer.daemon = True
+                    if self.on_timer:
+                        self.on_timer(self._timer)
+                    self._timer.start()
+                return
+        self.render()
+
+    def _deferred_render(self):
+        with self._lock:
+            self._timer = None
+        self.render()
+
+    def close(self):
+        """Cancela o envio agendado e envia imediatamente as linhas pendentes."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+            timer.join()
+        self.render()
 
 
 # Define um gerenciador de contexto para capturar saídas (prints) dentro de um bloco `with`.
 @contextmanager
-def capture_output(container):
-    """Captura stdout e redireciona a saída para um container do Streamlit."""
+def capture_output(container, **options):
+    """Captura stdout e redireciona a saída para um container do Streamlit.
+
+    As opções (ex: `tail_lines=50`) são repassadas ao StreamlitProcessOutput.
+    """
     # Cria um buffer em memória para armazenar temporariamente o texto.
     string_io = StringIO()
 
-    # Cria uma instância do manipulador de saída customizado.
-    output_handler = StreamlitProcessOutput(container)
+    # Importa o contexto de execução do Streamlit (só aqui: os workers da fila não carregam o Streamlit).
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+    # Cria uma instância do manipulador de saída customizado; o timer de envio
+    # herda o contexto do script para poder atualizar o container.
+    ctx = get_script_run_ctx()
+    output_handler = StreamlitProcessOutput(container, on_timer=lambda thread: add_script_run_ctx(thread, ctx), **options)
 
     # Guarda a saída padrão original (stdout original do Python).
     old_stdout = sys.stdout
@@ -107,6 +185,9 @@ def capture_output(container):
         # Restaura a saída padrão ao final do bloco `with`, garantindo que o sistema volte ao normal.
         sys.stdout = old_stdout
 
+        # Envia ao app as últimas linhas que ainda aguardavam o próximo intervalo de atualização.
+        output_handler.close()
+
 
 # Define explicitamente quais símbolos são exportados ao importar este módulo.
 # Assim, apenas `capture_output` ficará acessível se outro arquivo fizer `from arquivo import *`.
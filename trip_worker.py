@@ -0,0 +1,37 @@
+# ==========================================================
+# 🛠️ AgentAI Trip - Worker de geração de roteiros
+# Executa os trabalhos enfileirados pelo app em um pool de processos.
+# Vários workers (inclusive em outras máquinas que compartilhem o jobs.db)
+# podem rodar ao mesmo tempo: cada trabalho é assumido por apenas um deles.
+#
+# Uso: python trip_worker.py --processes 4
+# (com o app configurado em TRIP_JOB_MODE=external)
+# ==========================================================
+
+import argparse
+import functools
+
+from trip_artifacts import ARTIFACTS_DB_PATH
+from trip_jobs import JOB_WORKERS, JOBS_DB_PATH, JobQueue, run_trip
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de geração de roteiros do AgentAI Trip")
+    parser.add_argument("--processes", type=int, default=JOB_WORKERS, help="crews executadas ao mesmo tempo")
+    parser.add_argument("--db", default=JOBS_DB_PATH, help="banco SQLite da fila de trabalhos")
+    parser.add_argument("--artifacts-db", default=ARTIFACTS_DB_PATH, help="banco SQLite dos relatórios e PDFs gerados")
+    args = parser.parse_args()
+
+    queue = JobQueue(
+        functools.partial(run_trip, store_path=args.artifacts_db),
+        path=args.db,
+        max_workers=args.processes,
+        mode="process",
+    )
+    recovered = queue.recover()
+    print(f"Worker {queue.worker_id}: {args.processes} processo(s), {recovered} trabalho(s) retomado(s)")
+    queue.serve_forever()
+
+
+if __name__ == "__main__":
+    main()